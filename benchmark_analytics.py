@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark: match analytics with NumPy columns vs. plain dicts.
+
+Generates synthetic match rows (same shape as js/messi-matches.jsonl), runs
+every /api/analytics query on both engines, checks they agree and prints
+the timings.
+
+Usage: python3 benchmark_analytics.py [--rows 100000] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import server
+
+COMPETITIONS = {
+    'barcelona': ['la_liga', 'champions_league', 'copa_del_rey'],
+    'psg': ['ligue1', 'champions_league', 'coupe_de_france'],
+    'inter_miami': ['mls', 'leagues_cup', 'concacaf_champions'],
+    'argentina': ['eliminatorias', 'copa_america', 'copa_mundial', 'amistoso'],
+}
+
+
+def synthetic_matches(count, seed=10):
+    """`count` random matches spread over 2004-2025."""
+    rng = random.Random(seed)
+    start = date(2004, 10, 16)
+    span = (date(2025, 12, 31) - start).days
+    teams = list(COMPETITIONS)
+    rows = []
+    for _ in range(count):
+        team = rng.choice(teams)
+        rows.append({
+            'date': (start + timedelta(days=rng.randrange(span))).isoformat(),
+            'team': team,
+            'competition': rng.choice(COMPETITIONS[team]),
+            'goals': rng.choice((0, 0, 0, 1, 1, 2, 3)),
+            'assists': rng.choice((0, 0, 1, 2)),
+            'minutes': rng.randint(1, 120),
+        })
+    return rows
+
+
+QUERIES = [
+    ('goals_by_year_competition', {}),
+    ('goals_by_year_competition', {'team': 'inter_miami'}),
+    ('rolling_goal_rate', {'window': 10}),
+    ('cumulative_goals', {'team': 'argentina'}),
+]
+
+
+def timed(fn, repeat):
+    """Best wall time of `repeat` runs, in milliseconds, and the last result."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if server.np is None:
+        raise SystemExit('NumPy is not installed: pip install numpy')
+
+    rows = synthetic_matches(args.rows)
+    print(f'{args.rows} synthetic matches, best of {args.repeat}\n')
+
+    load_dict, tables_dict = timed(lambda: server.DictMatches(rows), args.repeat)
+    load_np, tables_np = timed(lambda: server.ColumnarMatches(rows), args.repeat)
+    print(f'{"query":<48} {"dict ms":>10} {"numpy ms":>10} {"speedup":>8}')
+    print(f'{"load":<48} {load_dict:>10.1f} {load_np:>10.1f} {load_dict / load_np:>7.1f}x')
+
+    for name, params in QUERIES:
+        label = name + ''.join(f' {k}={v}' for k, v in params.items())
+        ms_dict, expected = timed(lambda: getattr(tables_dict, name)(**params), args.repeat)
+        ms_np, result = timed(lambda: getattr(tables_np, name)(**params), args.repeat)
+        if name == 'rolling_goal_rate':
+            same = (result['dates'] == expected['dates'] and
+                    all(abs(a - b) < 1e-9 for a, b in zip(result['rate'], expected['rate'])))
+        else:
+            same = result == expected
+        if not same:
+            raise SystemExit(f'❌ {label}: engines disagree')
+        print(f'{label:<48} {ms_dict:>10.1f} {ms_np:>10.1f} {ms_dict / ms_np:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
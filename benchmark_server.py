@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Benchmark: load test of server.py endpoints, compared against a baseline.
+
+Starts server.py on a free port in a temporary copy of the site (so the
+update-team writes never touch js/messi-stats.json), then drives each
+scenario with N keep-alive clients for a fixed time. Prints throughput,
+p50/p95/p99 latency and error rate per scenario, and compares them with a
+stored baseline: exits with status 1 if any scenario regressed.
+
+Usage: python3 benchmark_server.py [--duration 5] [--concurrency 16]
+                                   [--scenarios stats,status,static,update-team]
+                                   [--server-args "--mode async --workers 8"]
+                                   [--baseline benchmark-baseline.json] [--save-baseline]
+                                   [--tolerance 0.2]
+
+The baseline only means something on the machine that recorded it: run
+with --save-baseline before a change, then without it after the change.
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import shlex
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(ROOT, 'benchmark-baseline.json')
+# What the server needs to answer every scenario
+SITE_FILES = ['server.py', 'index.html', 'css', 'js', 'images']
+STATIC_ASSETS = ['/index.html', '/css/global.css', '/js/chatbot.js', '/images/EscudoPSG.png']
+AUTH = 'Basic ' + base64.b64encode(b'admin:messi10').decode()
+
+
+# ── Scenarios ─────────────────────────────────────────────
+
+def stats_requests(site):
+    while True:
+        yield 'GET', '/api/stats', None, {'Accept-Encoding': 'gzip'}
+
+
+def status_requests(site):
+    while True:
+        yield 'GET', '/api/status', None, {}
+
+
+def static_requests(site):
+    while True:
+        for path in STATIC_ASSETS:
+            yield 'GET', path, None, {'Accept-Encoding': 'gzip'}
+
+
+def update_team_requests(site):
+    """Rewrites PSG with its current numbers, so the document stays valid."""
+    with open(os.path.join(site, 'js', 'messi-stats.json'), encoding='utf-8') as f:
+        psg = json.load(f)['teams']['psg']
+    body = json.dumps({'team': 'psg', **{field: psg[field] for field in
+                                          ('matches', 'goals', 'assists', 'titles')}}).encode()
+    headers = {'Authorization': AUTH, 'Content-Type': 'application/json'}
+    while True:
+        yield 'POST', '/api/update-team', body, headers
+
+
+SCENARIOS = {
+    'stats': stats_requests,
+    'status': status_requests,
+    'static': static_requests,
+    'update-team': update_team_requests,
+}
+
+
+# ── Server ────────────────────────────────────────────────
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def copy_site():
+    site = tempfile.mkdtemp(prefix='messi-bench-')
+    for name in SITE_FILES:
+        source = os.path.join(ROOT, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(site, name))
+        else:
+            shutil.copy2(source, site)
+    return site
+
+
+def start_server(site, port, server_args):
+    env = dict(os.environ,
+               # The limiter would turn the benchmark into a 429 benchmark
+               RATE_LIMIT_READ_RPS='0', RATE_LIMIT_ADMIN_RPS='0',
+               STATS_BACKEND='json', PYTHONUNBUFFERED='1')
+    env.pop('PORT', None)
+    log = open(os.path.join(site, 'server.log'), 'wb')
+    process = subprocess.Popen([sys.executable, 'server.py', str(port), *server_args],
+                               cwd=site, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'❌ server.py exited with {process.returncode}; '
+                             f'see {site}/server.log')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/status')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit('❌ server.py did not start within 15 s')
+
+
+# ── Load ──────────────────────────────────────────────────
+
+def client(port, requests, measure_from, deadline, latencies, errors):
+    """One keep-alive client: sends requests back to back until `deadline`."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    while True:
+        method, path, body, headers = next(requests)
+        started = time.perf_counter()
+        if started >= deadline:
+            break
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            failed = response.status >= 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            failed = True
+        if started >= measure_from:
+            latencies.append(time.perf_counter() - started)
+            errors[0] += failed
+    conn.close()
+
+
+def run_scenario(port, name, site, concurrency, duration, warmup):
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+    results = [([], [0]) for _ in range(concurrency)]
+    threads = [threading.Thread(target=client, args=(port, SCENARIOS[name](site), measure_from,
+                                                     deadline, latencies, errors))
+               for latencies, errors in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies = sorted(value for values, _ in results for value in values)
+    errors = sum(count for _, (count,) in results)
+    return summarize(latencies, errors, duration)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of sorted `values`."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def summarize(latencies, errors, duration):
+    count = len(latencies)
+    return {
+        'requests': count,
+        'rps': round(count / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'error_rate': round(errors / count, 4) if count else 1.0,
+    }
+
+
+# ── Baseline ──────────────────────────────────────────────
+
+def regressions(results, baseline, tolerance, min_delta_ms):
+    """Human-readable list of metrics that got worse than the baseline allows."""
+    found = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current['rps'] < before['rps'] * (1 - tolerance):
+            found.append(f'{name}: {current["rps"]} req/s vs {before["rps"]} in the baseline')
+        for key in ('p50_ms', 'p95_ms'):
+            if (current[key] > before[key] * (1 + tolerance)
+                    and current[key] - before[key] > min_delta_ms):
+                found.append(f'{name}: {key} {current[key]} vs {before[key]} in the baseline')
+        if current['error_rate'] > before['error_rate'] + 0.01:
+            found.append(f'{name}: error rate {current["error_rate"]:.2%} '
+                         f'vs {before["error_rate"]:.2%} in the baseline')
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=5,
+                        help='measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=1,
+                        help='unmeasured seconds before each scenario')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--server-args', default='',
+                        help='extra server.py arguments, e.g. "--mode async"')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write the results as the new baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative drop in req/s or rise in p50/p95')
+    parser.add_argument('--min-delta-ms', type=float, default=1,
+                        help='latency rises smaller than this never count as regressions')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f'Unknown scenarios {unknown}; choose from {list(SCENARIOS)}')
+    config = {'duration': args.duration, 'concurrency': args.concurrency,
+              'server_args': args.server_args}
+
+    site = copy_site()
+    port = free_port()
+    server = start_server(site, port, shlex.split(args.server_args))
+    results = {}
+    try:
+        print(f'server.py {args.server_args or "(defaults)"} · {args.concurrency} clients · '
+              f'{args.duration:g}s per scenario\n')
+        print(f'{"scenario":<14} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+              f'{"errors":>8}')
+        for name in names:
+            result = results[name] = run_scenario(port, name, site, args.concurrency,
+                                                  args.duration, args.warmup)
+            print(f'{name:<14} {result["rps"]:>9.1f} {result["p50_ms"]:>9.2f} '
+                  f'{result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} '
+                  f'{result["error_rate"]:>8.2%}')
+    finally:
+        server.terminate()
+        try:
+            server.wait(5)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(site, ignore_errors=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'results': results}, f, indent=2)
+            f.write('\n')
+        print(f'\n✅ Baseline saved to {os.path.relpath(args.baseline)}')
+        return
+    if not os.path.exists(args.baseline):
+        print(f'\nNo baseline at {os.path.relpath(args.baseline)}; run with --save-baseline')
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('config') != config:
+        print(f'\n⚠️  Baseline recorded with {baseline.get("config")}; results may not compare')
+    found = regressions(results, baseline['results'], args.tolerance, args.min_delta_ms)
+    if found:
+        print('\n❌ Regressions:')
+        for line in found:
+            print(f'   {line}')
+        sys.exit(1)
+    print(f'\n✅ No regressions against {os.path.relpath(args.baseline)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -32,6 +32,34 @@
     }
   }
 
+  /** Listen for live updates pushed by the server (SSE) */
+  function subscribeToUpdates() {
+    if (!('EventSource' in window)) return;
+    const source = new EventSource(DATA_PATH + '/stream');
+    let version = null;
+
+    async function refresh() {
+      messiData = null;
+      const data = await loadData();
+      if (!data) return;
+      updateTeamStats(data);
+      updateLastUpdated(data);
+    }
+
+    source.addEventListener('stats', (event) => {
+      version = JSON.parse(event.data).version;
+      refresh();
+    });
+    // Sent on connect when the server cannot replay what we missed. On the
+    // first connect the page is already current; after a reconnect, reload
+    // if the data moved on while we were away.
+    source.addEventListener('snapshot', (event) => {
+      const current = JSON.parse(event.data).version;
+      if (version !== null && current !== version) refresh();
+      version = current;
+    });
+  }
+
   /** Animate a number from 0 to target */
   function animateCounter(element, target, duration = 1500) {
     const start = 0;
@@ -287,6 +315,7 @@
 
     updateTeamStats(data);
     updateLastUpdated(data);
+    subscribeToUpdates();
 
     // Init chart if a team-specific chart container exists
     const chartEl = document.getElementById('goals-chart');
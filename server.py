@@ -4,32 +4,2957 @@ Messi Stats — Unified Server
 Combines proxy + admin functionality in a single server.
 Serves static files, API endpoints, and admin panel.
 
-Usage: python3 server.py [port]
-Default port: 8888
+Usage: python3 server.py [port] [--mode pool|async|single] [--workers N] [--processes N]
+                          [--max-inflight N] [--max-queue N] [--timeout SECONDS]
+                          [--no-keep-alive] [--idle-timeout SECONDS]
+                          [--max-requests N] [--server-timing] [--timing-log]
+       python3 server.py --precompress   # build gzip/brotli variants and exit
+       python3 server.py --migrate-sqlite [DB] / --export-json [DB]
+Default port: 8888, default mode: pool
 """
 
+import argparse
+import asyncio
+import bisect
+import copy
+import cProfile
+import email.utils
+import gzip
+import hashlib
 import http.server
+import io
 import json
+import marshal
+import mimetypes
+import mmap
 import os
+import pstats
 import re
-from datetime import datetime
+import selectors
+import signal
+import socket
+import sqlite3
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import traceback
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from datetime import date, datetime
 from urllib.parse import urlparse, parse_qs
 import base64
 
-# Handle PORT environment variable (Render may set it to empty string)
-port_env = os.environ.get('PORT', '8888')
-PORT = int(port_env) if port_env else 8888
-ADMIN_USER = os.environ.get('ADMIN_USER', 'admin')
-ADMIN_PASS = os.environ.get('ADMIN_PASS', 'messi10')
-STATS_FILE = 'js/messi-stats.json'
+# Handle PORT environment variable (Render may set it to empty string)
+port_env = os.environ.get('PORT', '8888')
+PORT = int(port_env) if port_env else 8888
+ADMIN_USER = os.environ.get('ADMIN_USER', 'admin')
+ADMIN_PASS = os.environ.get('ADMIN_PASS', 'messi10')
+STATS_FILE = 'js/messi-stats.json'
+MATCHES_FILE = os.environ.get('MATCHES_FILE', 'js/messi-matches.jsonl')
+
+# Where the stats live: 'json' (STATS_FILE + MATCHES_FILE) or 'sqlite' (STATS_DB)
+STATS_BACKEND = os.environ.get('STATS_BACKEND', 'json')
+STATS_DB = os.environ.get('STATS_DB', 'messi-stats.db')
+
+# Stats writes arriving within this window are committed with a single flush
+GROUP_COMMIT_WINDOW = float(os.environ.get('GROUP_COMMIT_WINDOW_MS') or 2) / 1000
+
+VALID_TEAMS = ['barcelona', 'psg', 'inter_miami', 'argentina']
+STAT_FIELDS = ['matches', 'goals', 'assists', 'titles']
+
+# Concurrency defaults (overridable from the command line)
+SERVER_MODE = os.environ.get('SERVER_MODE', 'pool')
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS') or 16)
+SERVER_MAX_INFLIGHT = int(os.environ.get('SERVER_MAX_INFLIGHT') or 64)
+SERVER_TIMEOUT = float(os.environ.get('SERVER_TIMEOUT') or 30)
+# Worker processes sharing the port (SO_REUSEPORT); 1 = no supervisor
+SERVER_PROCESSES = int(os.environ.get('SERVER_PROCESSES') or 1)
+# Connections waiting for a worker beyond this get an immediate 503 (0 = never)
+SERVER_MAX_QUEUE = int(os.environ.get('SERVER_MAX_QUEUE') or 32)
+# POST bodies over these sizes get 413 before they are read: the public
+# /api/ask/batch, and the authenticated admin writes
+MAX_POST_BODY = int(os.environ.get('MAX_POST_BODY') or 64 * 1024)
+MAX_ADMIN_POST_BODY = int(os.environ.get('MAX_ADMIN_POST_BODY') or 4 * 1024 * 1024)
+
+# Per-client token buckets for /api routes: (requests per second, burst); rate 0 = off
+RATE_LIMITS = {
+    'read': (float(os.environ.get('RATE_LIMIT_READ_RPS') or 20),
+             int(os.environ.get('RATE_LIMIT_READ_BURST') or 40)),
+    'admin': (float(os.environ.get('RATE_LIMIT_ADMIN_RPS') or 2),
+              int(os.environ.get('RATE_LIMIT_ADMIN_BURST') or 10)),
+}
+RATE_LIMIT_BUCKETS = int(os.environ.get('RATE_LIMIT_BUCKETS') or 10000)
+# Behind a reverse proxy (e.g. Render) key clients by the address it appends
+# to X-Forwarded-For instead of the socket peer, which is always the proxy
+RATE_LIMIT_TRUST_PROXY = os.environ.get('RATE_LIMIT_TRUST_PROXY', '0') in ('1', 'true', 'yes')
+
+# HTTP/1.1 persistent connections
+KEEP_ALIVE = os.environ.get('KEEP_ALIVE', '1') not in ('0', 'false', 'no')
+KEEP_ALIVE_IDLE_TIMEOUT = float(os.environ.get('KEEP_ALIVE_IDLE_TIMEOUT') or 5)
+KEEP_ALIVE_MAX_REQUESTS = int(os.environ.get('KEEP_ALIVE_MAX_REQUESTS') or 100)
+
+# Server-Sent Events (/api/stats/stream)
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT') or 15)
+SSE_MAX_SUBSCRIBERS = int(os.environ.get('SSE_MAX_SUBSCRIBERS') or 10000)
+
+# Compressed copies of static files live here, named by content hash
+STATIC_CACHE_DIR = os.environ.get('STATIC_CACHE_DIR', '.static-cache')
+# Small static files (and their compressed variants) are served from memory;
+# larger ones go out with sendfile()
+STATIC_MEMORY_BYTES = int(os.environ.get('STATIC_MEMORY_BYTES') or 8 * 1024 * 1024)
+STATIC_MEMORY_MAX_FILE = int(os.environ.get('STATIC_MEMORY_MAX_FILE') or 64 * 1024)
+# A Range header asking for more pieces than this is ignored (whole file)
+MAX_BYTE_RANGES = 16
+
+# Histogram buckets (seconds) for /api/metrics
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# Per-request phase timings: a Server-Timing header and/or one JSON log line
+# per request on stderr. Off by default (the header also leaks timing to clients)
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') in ('1', 'true', 'yes')
+SERVER_TIMING_LOG = os.environ.get('SERVER_TIMING_LOG', '0') in ('1', 'true', 'yes')
+
+
+# ── Derived views ─────────────────────────────────────────
+
+def add_counts(totals, counts, sign=1):
+    """Add (or with sign=-1 subtract) a {key: number} mapping into `totals`.
+    Keys whose total is zero are left out however they got there, so a set
+    evolved to some teams holds the same keys as one built from them."""
+    for key, value in counts.items():
+        total = totals.get(key, 0) + sign * value
+        if total:
+            totals[key] = total
+        else:
+            totals.pop(key, None)
+
+
+class DerivedView:
+    """An aggregate over the `teams` sub-documents.
+
+    `contribution(team)` maps one team to {key: number} and the view is the
+    key-wise sum over all teams, so editing a team only subtracts its old
+    contribution and adds the new one. `finish(totals)` shapes the sums into
+    the published result. `targets(views, data)` optionally returns {dotted
+    path: value} for fields of `data` that hold a copy of the result.
+    """
+
+    __slots__ = ('name', 'contribution', 'finish', 'targets')
+
+    def __init__(self, name, contribution, finish=dict, targets=None):
+        self.name = name
+        self.contribution = contribution
+        self.finish = finish
+        self.targets = targets
+
+
+DERIVED_VIEWS = {}
+
+
+def register_view(name, contribution, finish=dict, targets=None):
+    """Add a view to every ViewSet built from now on."""
+    DERIVED_VIEWS[name] = DerivedView(name, contribution, finish, targets)
+
+
+class ViewSet:
+    """The registered views computed for one document.
+
+    Immutable once built: `evolve()` returns a new set for an edited document,
+    re-folding only the teams that changed. Results are cached per set, so
+    career-wide queries after an edit cost a dict lookup.
+    """
+
+    __slots__ = ('views', '_contributions', '_totals', '_results')
+
+    def __init__(self, views, contributions, totals, results=None):
+        self.views = views
+        self._contributions = contributions
+        self._totals = totals
+        self._results = results or {}
+
+    @classmethod
+    def build(cls, teams, views=None):
+        """Fold every team of `teams` into a fresh set."""
+        views = dict(DERIVED_VIEWS if views is None else views)
+        contributions = {key: {name: view.contribution(team) for name, view in views.items()}
+                         for key, team in teams.items()}
+        totals = {name: {} for name in views}
+        for team_counts in contributions.values():
+            for name, counts in team_counts.items():
+                add_counts(totals[name], counts)
+        return cls(views, contributions, totals)
+
+    def evolve(self, teams, changed):
+        """The set for `teams`, given that only the `changed` team keys differ
+        from the document this set was built for."""
+        contributions = dict(self._contributions)
+        totals = dict(self._totals)
+        touched = set()
+        for key in changed:
+            old = contributions.pop(key, {})
+            new = {}
+            if key in teams:
+                new = contributions[key] = {name: view.contribution(teams[key])
+                                            for name, view in self.views.items()}
+            for name in self.views:
+                before, after = old.get(name, {}), new.get(name, {})
+                if before == after:
+                    continue
+                if name not in touched:
+                    totals[name] = dict(totals[name])
+                    touched.add(name)
+                add_counts(totals[name], before, -1)
+                add_counts(totals[name], after)
+        results = {name: value for name, value in self._results.items() if name not in touched}
+        return ViewSet(self.views, contributions, totals, results)
+
+    def result(self, name):
+        """Cached result of view `name`. Raises KeyError for an unknown view."""
+        try:
+            return self._results[name]
+        except KeyError:
+            value = self._results[name] = self.views[name].finish(self._totals[name])
+            return value
+
+    def targets(self, data):
+        """{dotted path: value} for every field of `data` mirroring a view."""
+        fields = {}
+        for view in self.views.values():
+            if view.targets is not None:
+                fields.update(view.targets(self, data))
+        return fields
+
+
+def carry_views(views, old_data, new_data):
+    """`views` (built for `old_data`) brought up to date for `new_data`."""
+    old_teams, new_teams = old_data.get('teams', {}), new_data.get('teams', {})
+    changed = [key for key in old_teams.keys() | new_teams.keys()
+               if old_teams.get(key) != new_teams.get(key)]
+    return views.evolve(new_teams, changed) if changed else views
+
+
+def _field(doc, parts):
+    """(parent dict, present) for the dotted path `parts` inside `doc`."""
+    for part in parts[:-1]:
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc, isinstance(doc, dict) and parts[-1] in doc
+
+
+class DerivedFieldError(ValueError):
+    """A write set a field that mirrors a derived view to another value."""
+
+
+def materialize_views(data, base, views):
+    """Write the view results into the fields of `data` that mirror them.
+
+    Only fields the document already has are written. Those fields always
+    follow the teams: a mutation that sets one itself (its value differs
+    from `base`) to anything but the derived value raises DerivedFieldError,
+    so the write is refused rather than undone by the next one.
+    """
+    for path, value in views.targets(data).items():
+        parts = path.split('.')
+        node, present = _field(data, parts)
+        if not present or node[parts[-1]] == value:
+            continue
+        base_node, base_present = _field(base, parts)
+        if base_present and base_node[parts[-1]] != node[parts[-1]]:
+            raise DerivedFieldError(f'{path} is derived from the teams ({value!r}); '
+                                    f'edit the teams instead')
+        node[parts[-1]] = value
+
+
+def team_stat_counts(team):
+    return {field: team.get(field, 0) for field in STAT_FIELDS}
+
+
+def career_totals_targets(views, data):
+    return {'career_totals.' + field: value
+            for field, value in views.result('career_totals').items()}
+
+
+# key -> (singular, plural, team) of the titles MessiBot answers about
+TITLE_COMPETITIONS = {
+    'copa_mundial': ('Copa Mundial', 'Copas Mundiales', 'Argentina'),
+    'copa_america': ('Copa América', 'Copas América', 'Argentina'),
+    'champions_league': ('Champions League', 'Champions League', 'el Barcelona'),
+    'la_liga': ('La Liga', 'La Liga', 'el Barcelona'),
+    'ligue1': ('Ligue 1', 'Ligue 1', 'el PSG'),
+    'leagues_cup': ('Leagues Cup', 'Leagues Cup', 'Inter Miami'),
+    'supporters_shield': ("MLS Supporters' Shield", "MLS Supporters' Shield", 'Inter Miami'),
+}
+# The titles named in titles_detail.major_titles_summary, in order
+SUMMARY_TITLES = ['copa_mundial', 'copa_america', 'champions_league', 'la_liga', 'ligue1']
+
+
+def join_es(items):
+    """'a', 'a y b', 'a, b y c'."""
+    items = [str(item) for item in items]
+    if len(items) < 2:
+        return ''.join(items)
+    return ', '.join(items[:-1]) + ' y ' + items[-1]
+
+
+def title_name(key, count):
+    singular, plural, _ = TITLE_COMPETITIONS[key]
+    return singular if count == 1 else plural
+
+
+def titles_summary(total, counts):
+    """The first-person titles summary MessiBot answers with."""
+    named = [f'{counts[key]} {title_name(key, counts[key])}'
+             for key in SUMMARY_TITLES if counts.get(key)]
+    return (f"He ganado {total} títulos en mi carrera: {', '.join(named)}, "
+            f"y varios otros títulos importantes.")
+
+
+def title_answer(key, count, years):
+    """MessiBot's answer for one competition of TITLE_COMPETITIONS. `years`
+    is the hand-kept list of wins; it is left out once it no longer has
+    `count` entries."""
+    singular, _, team = TITLE_COMPETITIONS[key]
+    if not count:
+        return f'No he ganado ninguna {singular} con {team}'
+    answer = f'Gané {count} {title_name(key, count)} con {team}'
+    if isinstance(years, list) and len(years) == count:
+        answer += f' en {join_es(years)}'
+    return answer
+
+
+def titles_targets(views, data):
+    counts = views.result('titles_by_competition')
+    # titles_detail.total is the career titles count, i.e. the sum of the
+    # teams' `titles`, the same number as career_totals.titles
+    total = views.result('career_totals')['titles']
+    by_competition = data.get('titles_detail', {}).get('by_competition', {})
+    fields = {}
+    for key in counts.keys() | by_competition.keys():
+        count = counts.get(key, 0)
+        fields[f'titles_detail.by_competition.{key}.count'] = count
+        if key in TITLE_COMPETITIONS and isinstance(by_competition.get(key), dict):
+            fields[f'titles_detail.by_competition.{key}.answer'] = \
+                title_answer(key, count, by_competition[key].get('years'))
+    fields['titles_detail.total'] = total
+    fields['titles_detail.major_titles_summary'] = titles_summary(total, counts)
+    return fields
+
+
+register_view('career_totals', team_stat_counts,
+              finish=lambda totals: {field: totals.get(field, 0) for field in STAT_FIELDS},
+              targets=career_totals_targets)
+register_view('goals_by_year', lambda team: team.get('goals_by_year', {}),
+              finish=lambda totals: dict(sorted(totals.items())))
+register_view('titles_by_competition', lambda team: team.get('major_titles', {}),
+              targets=titles_targets)
+
+
+# ── Metrics ───────────────────────────────────────────────
+
+class MetricsShard:
+    """One thread's share of the metrics; only that thread writes to it."""
+
+    __slots__ = ('values', 'requests', 'started', 'finished')
+
+    def __init__(self):
+        # (name, label values) -> number, or bucket counts for histograms
+        self.values = {}
+        # (route, method, status) -> bucket counts + [sum, bytes]
+        self.requests = {}
+        self.started = 0
+        self.finished = 0
+
+
+class Metrics:
+    """Counters, gauges and histograms exported in Prometheus text format.
+
+    Each thread records into its own shard, so recording never takes a
+    lock; the shards are only summed when /api/metrics is scraped. A
+    request costs one dict update (count, latency bucket, duration sum and
+    bytes live in a single list per route/method/status); the HTTP series
+    are split back out at scrape time. Values owned by other objects (queue
+    depth, subscribers, ...) are read then too, through callbacks.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._meta = {}
+        self._callbacks = []
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._local = threading.local()
+
+    def describe(self, name, kind, help, labels=()):
+        """Declare a metric recorded with inc() (counter, gauge) or observe() (histogram)."""
+        self._meta[name] = (kind, help, labels)
+
+    def callback(self, name, kind, help, read):
+        """Declare a metric whose value is `read(server)` at scrape time;
+        a None result leaves it out."""
+        self.describe(name, kind, help)
+        self._callbacks.append((name, read))
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = MetricsShard()
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def inc(self, name, labels=(), value=1):
+        values = self._shard().values
+        key = (name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        values = self._shard().values
+        key = (name, labels)
+        counts = values.get(key)
+        if counts is None:
+            # One count per bucket, then +Inf, then the sum
+            counts = values[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def request_started(self):
+        self._shard().started += 1
+
+    def request_finished(self, route, method, status, seconds, nbytes):
+        """Record an answered request (status None: the client went away)."""
+        shard = self._shard()
+        shard.finished += 1
+        if status is None:
+            return
+        key = (route, method, status)
+        counts = shard.requests.get(key)
+        if counts is None:
+            # Bucket counts, +Inf, duration sum, body bytes
+            counts = shard.requests[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        counts[-2] += seconds
+        counts[-1] += nbytes
+
+    def collect(self, server=None):
+        """{name: {labels: value}} summed over every shard, plus the callbacks."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        series = {}
+
+        def add(name, labels, value):
+            values = series.setdefault(name, {})
+            total = values.get(labels)
+            if total is None:
+                values[labels] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                values[labels] = [a + b for a, b in zip(total, value)]
+            else:
+                values[labels] = total + value
+
+        in_flight = 0
+        for shard in shards:
+            for (name, labels), value in list(shard.values.items()):
+                add(name, labels, value)
+            for (route, method, status), counts in list(shard.requests.items()):
+                add('messi_http_requests_total', (route, method, status), sum(counts[:-2]))
+                add('messi_http_request_duration_seconds', (route,), counts[:-1])
+                add('messi_http_response_bytes_total', (route,), counts[-1])
+            in_flight += shard.started - shard.finished
+        series['messi_http_requests_in_flight'] = {(): in_flight}
+        for name, read in self._callbacks:
+            value = read(server)
+            if value is not None:
+                series[name] = {(): value}
+        return series
+
+    def render(self, server=None):
+        """The Prometheus text exposition of every metric with samples."""
+        series = self.collect(server)
+        bounds = [repr(float(b)) for b in self.buckets] + ['+Inf']
+        lines = []
+        for name, (kind, help, labelnames) in self._meta.items():
+            values = series.get(name)
+            if not values:
+                continue
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(values.items()):
+                pairs = ','.join(f'{k}="{prom_escape(v)}"' for k, v in zip(labelnames, labels))
+                if kind != 'histogram':
+                    lines.append(f'{name}{{{pairs}}} {value}' if pairs else f'{name} {value}')
+                    continue
+                prefix = pairs + ',' if pairs else ''
+                count = 0
+                for bound, n in zip(bounds, value):
+                    count += n
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {count}')
+                suffix = f'{{{pairs}}}' if pairs else ''
+                lines.append(f'{name}_sum{suffix} {value[-1]}')
+                lines.append(f'{name}_count{suffix} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def prom_escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Every /api route, so request labels stay a bounded set
+API_ROUTES = frozenset([
+    '/api/stats', '/api/stats/stream', '/api/teams', '/api/analytics', '/api/views',
+    '/api/status', '/api/bot-data', '/api/ask', '/api/metrics', '/api/update',
+    '/api/update-full', '/api/update-team', '/api/update-batch', '/api/matches',
+    '/api/ask/batch', '/api/profile',
+])
+
+
+def route_label(path):
+    """Metrics label for a request path: its /api route, 'admin' or 'static'."""
+    if not path.startswith('/api/'):
+        return 'admin' if path.startswith('/admin') else 'static'
+    if path in API_ROUTES:
+        return path
+    for prefix in ('/api/teams/', '/api/views/', '/api/profile/'):
+        if path.startswith(prefix):
+            return prefix[:-1]
+    return '/api/other'
+
+
+METRICS = Metrics()
+METRICS.describe('messi_http_requests_total', 'counter',
+                 'Requests answered, by route, method and status.', ('route', 'method', 'status'))
+METRICS.describe('messi_http_request_duration_seconds', 'histogram',
+                 'Time from parsing the request line to the end of the handler.', ('route',))
+METRICS.describe('messi_http_response_bytes_total', 'counter',
+                 'Response body bytes (Content-Length) sent, by route.', ('route',))
+METRICS.describe('messi_http_requests_in_flight', 'gauge',
+                 'Requests being handled right now.')
+METRICS.describe('messi_snapshot_cache_total', 'counter',
+                 'Stats snapshot lookups: store (reload check), shared (multi-process '
+                 'segment), derived (per-version caches such as compressed bodies).',
+                 ('cache', 'result'))
+METRICS.describe('messi_json_parse_seconds', 'histogram',
+                 'Time to load and parse the stats document from the backend.', ('backend',))
+METRICS.describe('messi_json_serialize_seconds', 'histogram',
+                 'Time to serialize a new stats snapshot body.')
+METRICS.describe('messi_store_save_seconds', 'histogram',
+                 'Time to durably save the stats document.', ('backend',))
+METRICS.callback('messi_server_busy_connections', 'gauge',
+                 'Connections held by a worker or waiting for one (pool engine).',
+                 lambda server: getattr(server, 'active', None))
+METRICS.callback('messi_server_queued_requests', 'gauge',
+                 'Requests waiting for a free handler slot (async engine).',
+                 lambda server: getattr(server, 'waiting', None))
+METRICS.callback('messi_server_shed_total', 'counter',
+                 'Connections answered 503 because the queue was full.',
+                 lambda server: getattr(server, 'shed', None))
+
+
+# ── Request timing ────────────────────────────────────────
+
+class PhaseTimer:
+    """Durations of the named phases of one request, in first-seen order."""
+
+    __slots__ = ('started', 'phases')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        """Server-Timing value (milliseconds) for the phases so far."""
+        parts = [f'{name};dur={seconds * 1000:.3f}' for name, seconds in self.phases.items()]
+        parts.append(f'total;dur={self.elapsed() * 1000:.3f}')
+        return ', '.join(parts)
+
+
+class Phase:
+    """Context manager adding the time spent in its block to a timer."""
+
+    __slots__ = ('timer', 'name', 'started')
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, time.perf_counter() - self.started)
+
+
+class NoPhase:
+    """Stand-in for Phase when the request is not being timed."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NO_PHASE = NoPhase()
+# The PhaseTimer of the request the current thread is handling
+_request_timing = threading.local()
+
+
+def current_timer():
+    return getattr(_request_timing, 'timer', None)
+
+
+def timed(name):
+    """Charge the `with` block to phase `name` of the current request.
+
+    Code below the handler (the store, snapshots) uses this too, so a phase
+    is attributed wherever it actually happens. Costs one thread-local
+    lookup when timing is off.
+    """
+    timer = getattr(_request_timing, 'timer', None)
+    return NO_PHASE if timer is None else Phase(timer, name)
+
+
+# ── Storage backends ──────────────────────────────────────
+
+class JSONFileBackend:
+    """js/messi-stats.json as the database (the default).
+
+    The change token is the file's (inode, mtime, size), so a reader notices
+    an external rewrite with a single stat(). Every save renames a new file
+    into place, so the inode changes even when two saves land within one
+    mtime tick with the same size. Saves write a temp file, fsync it and
+    rename it over the original.
+    """
+
+    name = 'json'
+
+    def __init__(self, path, matches_path=None):
+        self.path = path
+        self.matches_path = matches_path
+        self.lock_path = path + '.lock'
+
+    def token(self):
+        st = os.stat(self.path)
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def load(self):
+        """Return (data, token, mtime_ns). Raises ValueError if the file is
+        half-written."""
+        st = os.stat(self.path)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data, (st.st_ino, st.st_mtime_ns, st.st_size), st.st_mtime_ns
+
+    def save(self, data, body):
+        """Durably replace the document; returns (token, mtime_ns)."""
+        tmp = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            # The rename keeps the temp file's inode, so its stat is final
+            st = os.stat(tmp)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self._fsync_dir()
+        return (st.st_ino, st.st_mtime_ns, st.st_size), st.st_mtime_ns
+
+    def _fsync_dir(self):
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def match_log(self):
+        return MatchLog(self.matches_path or MATCHES_FILE)
+
+
+class SQLiteBackend:
+    """The stats in an SQLite database in WAL mode.
+
+    Teams, titles per competition, goals per year and matches are indexed
+    tables; the other top-level sections are stored as JSON, in document
+    order, so `load()` rebuilds exactly the shape of messi-stats.json.
+
+    Every thread gets its own connection, opened lazily, and every process
+    its own set: a worker forked by --processes never reuses one the master
+    opened before the fork. In WAL mode readers see the last
+    committed state without taking locks, so a writer (this server or an
+    external updater) never blocks a request. The read queries are fixed
+    parameterized statements, compiled once per connection by sqlite3's
+    statement cache. Writers bump `state.revision`, which is the change
+    token readers poll.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            revision INTEGER NOT NULL,
+            saved_ns INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS document (
+            key TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS teams (
+            key TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            name TEXT,
+            period TEXT,
+            matches INTEGER,
+            goals INTEGER,
+            assists INTEGER,
+            titles INTEGER,
+            fields TEXT NOT NULL,
+            extra TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS titles (
+            team TEXT NOT NULL,
+            competition TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (team, competition)
+        );
+        CREATE INDEX IF NOT EXISTS titles_competition ON titles (competition);
+        CREATE TABLE IF NOT EXISTS goals_by_year (
+            team TEXT NOT NULL,
+            year TEXT NOT NULL,
+            goals INTEGER NOT NULL,
+            PRIMARY KEY (team, year)
+        );
+        CREATE INDEX IF NOT EXISTS goals_by_year_year ON goals_by_year (year);
+        CREATE TABLE IF NOT EXISTS matches (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            team TEXT NOT NULL,
+            competition TEXT NOT NULL,
+            goals INTEGER NOT NULL,
+            assists INTEGER NOT NULL,
+            minutes INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS matches_date ON matches (date);
+        CREATE INDEX IF NOT EXISTS matches_team_date ON matches (team, date);
+        INSERT OR IGNORE INTO state (id, revision, saved_ns) VALUES (1, 0, 0);
+    '''
+
+    # Team members kept in their own columns / tables; the rest go to `extra`
+    TEAM_COLUMNS = ['name', 'period', 'matches', 'goals', 'assists', 'titles']
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._local = threading.local()
+        # Connections a forked worker inherited from the master, kept
+        # referenced (never used or closed) so the child doesn't finalize them
+        self._inherited = []
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is not None and self._local.pid != os.getpid():
+            # Opened before --processes forked this worker; SQLite connections
+            # must not cross fork(), so this process opens its own
+            self._inherited.append(db)
+            db = None
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, isolation_level=None)
+            self._local.pid = os.getpid()
+            db.execute('PRAGMA journal_mode=WAL')
+            # fsync on every commit, as durable as the JSON backend
+            db.execute('PRAGMA synchronous=FULL')
+            db.execute('PRAGMA busy_timeout=5000')
+            db.executescript(self.SCHEMA)
+        return db
+
+    def token(self):
+        return self._db().execute('SELECT revision FROM state WHERE id = 1').fetchone()[0]
+
+    def load(self):
+        db = self._db()
+        db.execute('BEGIN')
+        try:
+            revision, saved_ns = db.execute(
+                'SELECT revision, saved_ns FROM state WHERE id = 1').fetchone()
+            if not revision:
+                raise FileNotFoundError(f'{self.path} has no stats; run --migrate-sqlite')
+            sections = db.execute('SELECT key, value FROM document ORDER BY position').fetchall()
+            teams = db.execute('SELECT key, fields, extra, ' + ', '.join(self.TEAM_COLUMNS) +
+                               ' FROM teams ORDER BY position').fetchall()
+            titles = db.execute(
+                'SELECT team, competition, count FROM titles ORDER BY team, position').fetchall()
+            goals = db.execute(
+                'SELECT team, year, goals FROM goals_by_year ORDER BY team, year').fetchall()
+        finally:
+            db.execute('COMMIT')
+
+        major_titles, goals_by_year = {}, {}
+        for team, competition, count in titles:
+            major_titles.setdefault(team, {})[competition] = count
+        for team, year, count in goals:
+            goals_by_year.setdefault(team, {})[year] = count
+        team_docs = {}
+        for key, fields, extra, *columns in teams:
+            values = json.loads(extra)
+            values.update(zip(self.TEAM_COLUMNS, columns))
+            values['major_titles'] = major_titles.get(key, {})
+            values['goals_by_year'] = goals_by_year.get(key, {})
+            team_docs[key] = {field: values[field] for field in json.loads(fields)}
+        data = {key: team_docs if key == 'teams' else json.loads(value)
+                for key, value in sections}
+        return data, revision, saved_ns
+
+    def save(self, data, body=None):
+        db = self._db()
+        saved_ns = time.time_ns()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            for table in ('document', 'teams', 'titles', 'goals_by_year'):
+                db.execute(f'DELETE FROM {table}')
+            db.executemany('INSERT INTO document (key, position, value) VALUES (?, ?, ?)', [
+                (key, position, None if key == 'teams' else json.dumps(value, ensure_ascii=False))
+                for position, (key, value) in enumerate(data.items())])
+            for position, (key, team) in enumerate(data.get('teams', {}).items()):
+                extra = {field: value for field, value in team.items()
+                         if field not in self.TEAM_COLUMNS
+                         and field not in ('major_titles', 'goals_by_year')}
+                db.execute('INSERT INTO teams (key, position, fields, extra, ' +
+                           ', '.join(self.TEAM_COLUMNS) + ') VALUES (?, ?, ?, ?' +
+                           ', ?' * len(self.TEAM_COLUMNS) + ')',
+                           (key, position, json.dumps(list(team)),
+                            json.dumps(extra, ensure_ascii=False),
+                            *(team.get(field) for field in self.TEAM_COLUMNS)))
+                db.executemany('INSERT INTO titles (team, competition, count, position) '
+                               'VALUES (?, ?, ?, ?)',
+                               [(key, competition, count, i) for i, (competition, count)
+                                in enumerate(team.get('major_titles', {}).items())])
+                db.executemany('INSERT INTO goals_by_year (team, year, goals) VALUES (?, ?, ?)',
+                               [(key, year, goals)
+                                for year, goals in team.get('goals_by_year', {}).items()])
+            db.execute('UPDATE state SET revision = revision + 1, saved_ns = ? WHERE id = 1',
+                       (saved_ns,))
+            revision = db.execute('SELECT revision FROM state WHERE id = 1').fetchone()[0]
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return revision, saved_ns
+
+    def match_log(self):
+        return SQLiteMatchLog(self)
+
+
+def open_backend(kind=None, path=None):
+    """The storage backend named by `kind` ('json' or 'sqlite')."""
+    kind = kind or STATS_BACKEND
+    if kind == 'json':
+        return JSONFileBackend(path or STATS_FILE)
+    if kind == 'sqlite':
+        return SQLiteBackend(path or STATS_DB)
+    raise ValueError(f'Unknown stats backend: {kind}')
+
+
+def migrate_to_sqlite(db_path, json_path=None, matches_path=None):
+    """One-shot import of messi-stats.json (and the match log) into a new
+    SQLite database. Returns the number of matches imported."""
+    if os.path.exists(db_path):
+        raise FileExistsError(f'{db_path} already exists')
+    with open(json_path or STATS_FILE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    folded_bytes = data.get('match_log', {}).get('offset', 0)
+    matches, folded = [], 0
+    for match, end in MatchLog(matches_path or MATCHES_FILE).read_from(0):
+        matches.append(match)
+        if end <= folded_bytes:
+            folded += 1
+    backend = SQLiteBackend(db_path)
+    if matches:
+        backend.match_log().append(matches)
+    if 'match_log' in data:
+        # Row ids start at 1, so "folded n matches" is offset n
+        data['match_log']['offset'] = folded
+    backend.save(data)
+    return len(matches)
+
+
+def export_json(db_path, json_path=None, matches_path=None):
+    """Write the SQLite database back out as messi-stats.json and the
+    match log. Returns the number of matches exported."""
+    backend = SQLiteBackend(db_path)
+    data = backend.load()[0]
+    folded_id = data.get('match_log', {}).get('offset', 0)
+    lines, folded_bytes = [], 0
+    for match, row_id in backend.match_log().read_from(0):
+        lines.append(json.dumps(match, ensure_ascii=False).encode('utf-8') + b'\n')
+        if row_id <= folded_id:
+            folded_bytes += len(lines[-1])
+    if 'match_log' in data:
+        data['match_log']['offset'] = folded_bytes
+    log = JSONFileBackend(matches_path or MATCHES_FILE)
+    if lines:
+        log.save(None, b''.join(lines))
+    body = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    JSONFileBackend(json_path or STATS_FILE).save(data, body)
+    return len(lines)
+
+
+# ── Stats snapshot ────────────────────────────────────────
+
+def last_modified_timestamp(data, mtime_ns=None):
+    """Unix time for Last-Modified: `last_updated` if parseable, else file mtime."""
+    try:
+        return int(datetime.strptime(data['last_updated'], '%Y-%m-%d %H:%M:%S').timestamp())
+    except (KeyError, TypeError, ValueError):
+        return mtime_ns // 1_000_000_000 if mtime_ns else None
+
+
+class StatsSnapshot:
+    """Immutable, parsed view of the stats file plus its serialized API body.
+
+    Never mutate `data` in place — writers work on a deep copy and publish a
+    new snapshot. `etag` is a hash of the serialized body, so every published
+    version gets its own tag and tags stay valid across server restarts.
+    """
+
+    __slots__ = ('data', 'body', 'etag', 'last_modified', 'version', 'mtime_ns', 'token',
+                 '_index', '_fragments', '_derived', '_views')
+
+    # Max number of distinct projections kept serialized per snapshot
+    MAX_FRAGMENTS = 256
+    # Max number of derived values (analytics keys come from the query string)
+    MAX_DERIVED = 256
+
+    def __init__(self, data, version, mtime_ns=None, token=None):
+        self.data = data
+        started = time.perf_counter()
+        self.body = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        METRICS.observe('messi_json_serialize_seconds', time.perf_counter() - started)
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+        self.last_modified = last_modified_timestamp(data, mtime_ns)
+        self.version = version
+        self.mtime_ns = mtime_ns
+        self.token = token
+        self._index = None
+        self._fragments = {}
+        self._derived = {}
+        self._views = None
+
+    def encoded(self, encoding):
+        """`body` compressed with `encoding` ('gzip' or 'br'), once per snapshot."""
+        return self.derived('encoded:' + encoding,
+                            lambda data: compress(self.body, encoding, fast=True))
+
+    def views(self):
+        """The derived views (career totals, combined goals_by_year, ...) of
+        this version; folded from scratch only if no earlier version had them."""
+        if self._views is None:
+            self._views = ViewSet.build(self.data.get('teams', {}))
+        return self._views
+
+    def derived(self, key, build):
+        """Value computed by `build(data)` once per snapshot and cached under `key`."""
+        try:
+            value = self._derived[key]
+        except KeyError:
+            METRICS.inc('messi_snapshot_cache_total', ('derived', 'miss'))
+            with timed('compute'):
+                value = build(self.data)
+            if len(self._derived) < self.MAX_DERIVED:
+                self._derived[key] = value
+            return value
+        METRICS.inc('messi_snapshot_cache_total', ('derived', 'hit'))
+        return value
+
+    def index(self):
+        """Dotted path -> value for every object member, built once per snapshot."""
+        if self._index is None:
+            index = {}
+            stack = [('', self.data)]
+            while stack:
+                prefix, node = stack.pop()
+                for key, value in node.items():
+                    path = prefix + key
+                    index[path] = value
+                    if isinstance(value, dict):
+                        stack.append((path + '.', value))
+            self._index = index
+        return self._index
+
+    def project(self, fields):
+        """Serialized JSON holding only `fields` (dotted paths), nested as in
+        the document. Raises KeyError for an unknown path."""
+        key = tuple(sorted(set(fields)))
+        body = self._fragments.get(key)
+        if body is not None:
+            return body
+        with timed('compute'):
+            index = self.index()
+            result = {}
+            for path in key:
+                value = index[path]
+                parts = path.split('.')
+                # An ancestor already selected includes this path
+                if any('.'.join(parts[:i]) in key for i in range(1, len(parts))):
+                    continue
+                node = result
+                for part in parts[:-1]:
+                    node = node.setdefault(part, {})
+                node[parts[-1]] = value
+            body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+        if len(self._fragments) < self.MAX_FRAGMENTS:
+            self._fragments[key] = body
+        return body
+
+    def fragment(self, path):
+        """Serialized JSON of the sub-document at `path`. Raises KeyError."""
+        body = self._fragments.get(path)
+        if body is None:
+            with timed('compute'):
+                body = json.dumps(self.index()[path], ensure_ascii=False).encode('utf-8')
+            if len(self._fragments) < self.MAX_FRAGMENTS:
+                self._fragments[path] = body
+        return body
+
+
+class PendingWrite:
+    """A mutation queued for the next group commit."""
+
+    __slots__ = ('mutate', 'result', 'error', 'done', 'queued', 'timings')
+
+    def __init__(self, mutate):
+        self.mutate = mutate
+        self.result = None
+        self.error = None
+        self.done = False
+        self.queued = time.perf_counter()
+        # Phases of the group commit that included this write
+        self.timings = None
+
+
+class FileLock:
+    """Exclusive advisory lock (flock) on `path`, shared by every process
+    that opens the same file. A no-op where fcntl is unavailable."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class StatsStore:
+    """The single read/write path for the stats, on top of a storage backend.
+
+    Readers call `get()`: one cheap change-token check (a stat() for the JSON
+    file) and, in the steady state, no locks. The document is only reloaded
+    when the token changed (an external updater rewrote it); if that copy
+    is half-written the current snapshot keeps being served.
+
+    Writers go through `update()` / `replace()`, which serialize on a writer
+    lock (and a file lock, shared with other server processes), durably
+    save the new document through the backend, then swap in the new
+    snapshot (copy-on-write: the old snapshot is never mutated, so in-flight
+    readers are unaffected).
+
+    Writes are group-committed: whichever writer takes the lock first waits
+    `group_window` seconds, then applies every queued mutation in arrival
+    order and writes the result once. Writers whose mutation was included
+    just pick up the shared snapshot.
+
+    After each mutation the derived views are carried forward by delta from
+    the teams it changed, and the fields mirroring them (career_totals,
+    titles_detail counts and answers) are rewritten; a mutation that sets
+    one of them to another value fails with DerivedFieldError.
+    """
+
+    def __init__(self, backend, group_window=GROUP_COMMIT_WINDOW):
+        self.backend = backend
+        self.group_window = group_window
+        self._current = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._queue = []
+        self._queue_lock = threading.Lock()
+        self._listeners = []
+        self.commits = 0
+        self.committed_writes = 0
+
+    def add_listener(self, callback):
+        """Call `callback(old, new)` whenever a new snapshot replaces the current one."""
+        self._listeners.append(callback)
+
+    def _swap(self, snap):
+        old, self._current = self._current, snap
+        return old
+
+    def get(self):
+        """Return the current snapshot, reloading it if the stored data changed."""
+        with timed('store'):
+            return self._get()
+
+    def _get(self):
+        token = self.backend.token()
+        snap = self._current
+        if snap is not None and snap.token == token:
+            METRICS.inc('messi_snapshot_cache_total', ('store', 'hit'))
+            return snap
+        with self._lock:
+            snap = self._current
+            if snap is not None and snap.token == token:
+                METRICS.inc('messi_snapshot_cache_total', ('store', 'hit'))
+                return snap
+            METRICS.inc('messi_snapshot_cache_total', ('store', 'miss'))
+            try:
+                started = time.perf_counter()
+                data, token, mtime_ns = self.backend.load()
+                METRICS.observe('messi_json_parse_seconds', time.perf_counter() - started,
+                                (self.backend.name,))
+            except ValueError:
+                # Caught a non-atomic writer mid-write; retry on the next get()
+                if snap is None:
+                    raise
+                return snap
+            self._version += 1
+            current = snap
+            snap = StatsSnapshot(data, self._version, mtime_ns, token)
+            if current is not None and current._views is not None:
+                # An external rewrite usually touches one team; fold only that
+                snap._views = carry_views(current._views, current.data, data)
+            old = self._swap(snap)
+        self._notify(old, snap)
+        return snap
+
+    def update(self, mutate):
+        """Apply `mutate(data)` to a copy of the current document and commit
+        it; returns the committed snapshot. If `mutate` raises, its changes
+        are discarded and the exception is re-raised here."""
+        write = PendingWrite(mutate)
+        with self._queue_lock:
+            self._queue.append(write)
+        with self._write_lock:
+            if not write.done:
+                if self.group_window:
+                    time.sleep(self.group_window)
+                with self._queue_lock:
+                    group, self._queue = self._queue, []
+                self._commit_group(group)
+        timer = current_timer()
+        if timer is not None and write.timings:
+            # The group may have been committed by another writer's thread
+            for name, seconds in write.timings.items():
+                timer.add(name, seconds)
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def replace(self, data):
+        """Commit `data` as the whole new document."""
+        def apply(current):
+            current.clear()
+            current.update(data)
+        return self.update(apply)
+
+    def _commit_group(self, group):
+        applied = []
+        timings = {}
+        try:
+            # Held across read-modify-write, so writes made by other server
+            # processes are seen by get() and never overwritten
+            with FileLock(self.backend.lock_path):
+                locked = time.perf_counter()
+                base = self._get()
+                working, views = base.data, base.views()
+                started = time.perf_counter()
+                timings['store'] = started - locked
+                for write in group:
+                    trial = copy.deepcopy(working)
+                    try:
+                        write.mutate(trial)
+                        trial_views = carry_views(views, working, trial)
+                        # Also with no team changed: the mutation may have
+                        # set a derived field directly
+                        materialize_views(trial, working, trial_views)
+                    except Exception as e:
+                        write.error = e
+                        continue
+                    working, views = trial, trial_views
+                    applied.append(write)
+                timings['compute'] = time.perf_counter() - started
+                if applied:
+                    snap = self._commit(working, views, timings)
+                    self.commits += 1
+                    self.committed_writes += len(applied)
+                    for write in applied:
+                        write.result = snap
+        except Exception as e:
+            for write in group:
+                if write.error is None:
+                    write.error = e
+        finally:
+            for write in group:
+                if timings:
+                    # Queueing, the group window and the file lock
+                    write.timings = {'wait': locked - write.queued, **timings}
+                write.done = True
+
+    def _commit(self, data, views=None, timings=None):
+        started = time.perf_counter()
+        snap = StatsSnapshot(data, None)
+        snap._views = views
+        with self._lock:
+            # Saving under the lock keeps a concurrent reload in get() from
+            # publishing the new data under an older version number
+            saving = time.perf_counter()
+            snap.token, snap.mtime_ns = self.backend.save(data, snap.body)
+            saved = time.perf_counter()
+            METRICS.observe('messi_store_save_seconds', saved - saving, (self.backend.name,))
+            if timings is not None:
+                timings['serialize'] = saving - started
+                timings['save'] = saved - saving
+            if snap.last_modified is None:
+                snap.last_modified = last_modified_timestamp(data, snap.mtime_ns)
+            self._version += 1
+            snap.version = self._version
+            old = self._swap(snap)
+        self._notify(old, snap)
+        return snap
+
+    def _notify(self, old, new):
+        if old is None:
+            return
+        for callback in self._listeners:
+            callback(old, new)
+
+
+STORE = StatsStore(open_backend())
+METRICS.callback('messi_store_commits_total', 'counter',
+                 'Group commits written by this process.', lambda server: STORE.commits)
+METRICS.callback('messi_store_writes_total', 'counter',
+                 'Writes included in those commits.', lambda server: STORE.committed_writes)
+
+
+# ── Match log ─────────────────────────────────────────────
+
+MATCH_FIELDS = ['date', 'team', 'competition', 'goals', 'assists', 'minutes']
+COMPETITION_FIELDS = ['matches', 'goals', 'assists', 'minutes']
+
+
+def parse_match(item):
+    """Validate one match from a request body. Raises ValueError."""
+    if not isinstance(item, dict):
+        raise ValueError(f'Invalid match: {item}')
+    missing = [field for field in MATCH_FIELDS if field not in item]
+    if missing:
+        raise ValueError(f'Missing field: {missing[0]}')
+    if item['team'] not in VALID_TEAMS:
+        raise ValueError(f'Invalid team. Must be one of: {VALID_TEAMS}')
+    competition = str(item['competition']).strip()
+    if not re.fullmatch(r'[a-z0-9_]+', competition):
+        raise ValueError(f'Invalid competition key: {competition!r}')
+    match = {
+        'date': date.fromisoformat(str(item['date'])).isoformat(),
+        'team': item['team'],
+        'competition': competition,
+    }
+    for field in ('goals', 'assists', 'minutes'):
+        match[field] = int(item[field])
+        if match[field] < 0:
+            raise ValueError(f'{field} must not be negative')
+    return match
+
+
+def fold_match(data, match):
+    """Add one match to the team it was played for: totals, goals_by_year
+    and the per-competition breakdown. Career-wide numbers follow through
+    the derived views."""
+    team = data['teams'][match['team']]
+    team['matches'] = team.get('matches', 0) + 1
+    team['goals'] = team.get('goals', 0) + match['goals']
+    team['assists'] = team.get('assists', 0) + match['assists']
+    year = match['date'][:4]
+    by_year = team.setdefault('goals_by_year', {})
+    by_year[year] = by_year.get(year, 0) + match['goals']
+    competition = team.setdefault('competitions', {}).setdefault(
+        match['competition'], {field: 0 for field in COMPETITION_FIELDS})
+    competition['matches'] += 1
+    for field in ('goals', 'assists', 'minutes'):
+        competition[field] += match[field]
+
+
+class MatchLog:
+    """Append-only log of matches, one JSON object per line.
+
+    The stats document is the materialized view of the log: it records the
+    offset (here a byte offset) it has folded up to under `match_log`, so
+    bringing it up to date only reads the entries after that offset.
+    Entries are never rewritten; a correction is a new entry.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, matches):
+        """Durably append `matches`; returns the log size afterwards."""
+        lines = b''.join(json.dumps(match, ensure_ascii=False).encode('utf-8') + b'\n'
+                         for match in matches)
+        with self._lock:
+            # Unbuffered: one O_APPEND write, so appends from other server
+            # processes never interleave with this one
+            with open(self.path, 'ab', buffering=0) as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+                return f.tell()
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def read_from(self, offset):
+        """Yield (match, end offset) for every complete line after `offset`."""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # An append in progress; it is picked up next time
+                    break
+                offset += len(line)
+                if line.strip():
+                    yield json.loads(line), offset
+
+    def fold_pending(self, data):
+        """Fold the entries `data` has not seen yet; returns how many."""
+        state = data.setdefault('match_log', {'offset': 0, 'matches': 0})
+        count = 0
+        for match, offset in self.read_from(state['offset']):
+            fold_match(data, match)
+            state['offset'] = offset
+            count += 1
+        state['matches'] += count
+        return count
+
+
+class SQLiteMatchLog(MatchLog):
+    """The match log as the `matches` table of an SQLiteBackend; offsets
+    are row ids."""
+
+    def __init__(self, backend):
+        super().__init__(backend.path)
+        self.backend = backend
+
+    def append(self, matches):
+        db = self.backend._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany('INSERT INTO matches (' + ', '.join(MATCH_FIELDS) + ') VALUES (' +
+                           ', '.join('?' * len(MATCH_FIELDS)) + ')',
+                           [[match[field] for field in MATCH_FIELDS] for match in matches])
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return self.size()
+
+    def size(self):
+        return self.backend._db().execute('SELECT COALESCE(MAX(id), 0) FROM matches').fetchone()[0]
+
+    def read_from(self, offset):
+        rows = self.backend._db().execute(
+            'SELECT id, ' + ', '.join(MATCH_FIELDS) + ' FROM matches WHERE id > ? ORDER BY id',
+            (offset,)).fetchall()
+        for row_id, *values in rows:
+            yield dict(zip(MATCH_FIELDS, values)), row_id
+
+
+def competition_goals(team):
+    return {key: stats.get('goals', 0) for key, stats in team.get('competitions', {}).items()}
+
+
+def competition_matches(team):
+    return {key: stats.get('matches', 0) for key, stats in team.get('competitions', {}).items()}
+
+
+register_view('goals_by_competition', competition_goals)
+register_view('matches_by_competition', competition_matches)
+
+MATCH_LOG = STORE.backend.match_log()
+
+
+def sync_match_log():
+    """Bring the stats file up to date with entries appended to the log but
+    not folded yet (e.g. the server stopped in between). Returns the count."""
+    if MATCH_LOG.size() <= STORE.get().data.get('match_log', {}).get('offset', 0):
+        return 0
+    folded = []
+
+    def apply(data):
+        folded.append(MATCH_LOG.fold_pending(data))
+        data['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    STORE.update(apply)
+    return folded[-1]
+
+
+# ── Match analytics ───────────────────────────────────────
+
+ANALYTICS_QUERIES = ['goals_by_year_competition', 'rolling_goal_rate', 'cumulative_goals']
+
+
+class DictMatches:
+    """Analytics over the match log as a list of dicts (the reference
+    implementation, and the fallback when NumPy is not installed)."""
+
+    engine = 'dict'
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: row['date'])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _select(self, team=None, competition=None):
+        return [row for row in self.rows
+                if (team is None or row['team'] == team)
+                and (competition is None or row['competition'] == competition)]
+
+    def goals_by_year_competition(self, team=None, competition=None):
+        result = {}
+        for row in self._select(team, competition):
+            if row['goals']:
+                by_competition = result.setdefault(row['date'][:4], {})
+                by_competition[row['competition']] = (by_competition.get(row['competition'], 0)
+                                                      + row['goals'])
+        return {year: dict(sorted(counts.items())) for year, counts in sorted(result.items())}
+
+    def rolling_goal_rate(self, window=10, team=None, competition=None):
+        rows = self._select(team, competition)
+        recent = deque()
+        total = 0
+        dates, rates = [], []
+        for row in rows:
+            recent.append(row['goals'])
+            total += row['goals']
+            if len(recent) > window:
+                total -= recent.popleft()
+            if len(recent) == window:
+                dates.append(row['date'])
+                rates.append(total / window)
+        return {'window': window, 'dates': dates, 'rate': rates}
+
+    def cumulative_goals(self, team=None, competition=None):
+        dates, goals = [], []
+        total = 0
+        for row in self._select(team, competition):
+            total += row['goals']
+            dates.append(row['date'])
+            goals.append(total)
+        return {'dates': dates, 'goals': goals}
+
+
+class ColumnarMatches:
+    """Analytics over the match log held as NumPy columns sorted by date:
+    team and competition are small integer codes, so group-by is a
+    bincount and rolling windows are differences of a cumulative sum."""
+
+    engine = 'numpy'
+
+    def __init__(self, rows):
+        self.teams = sorted({row['team'] for row in rows})
+        self.competitions = sorted({row['competition'] for row in rows})
+        team_codes = {key: code for code, key in enumerate(self.teams)}
+        competition_codes = {key: code for code, key in enumerate(self.competitions)}
+        dates = np.array([row['date'] for row in rows], dtype='datetime64[D]')
+        order = np.argsort(dates, kind='stable')
+        self.date = dates[order]
+        # The ISO strings as objects: returning them is a copy of references,
+        # much cheaper than formatting datetime64 values on every query
+        self.date_label = np.array([row['date'] for row in rows], dtype=object)[order]
+        self.year = self.date.astype('datetime64[Y]').astype(np.int32) + 1970
+        self.team = np.array([team_codes[row['team']] for row in rows], dtype=np.int16)[order]
+        self.competition = np.array([competition_codes[row['competition']] for row in rows],
+                                    dtype=np.int16)[order]
+        for field in ('goals', 'assists', 'minutes'):
+            setattr(self, field, np.array([row[field] for row in rows], dtype=np.int32)[order])
+
+    def __len__(self):
+        return len(self.date)
+
+    def _mask(self, team=None, competition=None):
+        mask = np.ones(len(self.date), dtype=bool)
+        if team is not None:
+            mask &= self.team == (self.teams.index(team) if team in self.teams else -1)
+        if competition is not None:
+            mask &= self.competition == (self.competitions.index(competition)
+                                         if competition in self.competitions else -1)
+        return mask
+
+    def goals_by_year_competition(self, team=None, competition=None):
+        mask = self._mask(team, competition)
+        years, codes, goals = self.year[mask], self.competition[mask], self.goals[mask]
+        if not len(years):
+            return {}
+        first = int(years.min())
+        width = len(self.competitions)
+        cells = np.bincount((years - first) * width + codes, weights=goals,
+                            minlength=(int(years.max()) - first + 1) * width)
+        result = {}
+        for cell in np.flatnonzero(cells):
+            year, code = divmod(int(cell), width)
+            result.setdefault(str(first + year), {})[self.competitions[code]] = int(cells[cell])
+        return result
+
+    def rolling_goal_rate(self, window=10, team=None, competition=None):
+        mask = self._mask(team, competition)
+        goals = self.goals[mask]
+        if len(goals) < window:
+            return {'window': window, 'dates': [], 'rate': []}
+        running = np.concatenate(([0], np.cumsum(goals, dtype=np.int64)))
+        rates = (running[window:] - running[:-window]) / window
+        return {'window': window, 'dates': self.date_label[mask][window - 1:].tolist(),
+                'rate': rates.tolist()}
+
+    def cumulative_goals(self, team=None, competition=None):
+        mask = self._mask(team, competition)
+        return {'dates': self.date_label[mask].tolist(),
+                'goals': np.cumsum(self.goals[mask], dtype=np.int64).tolist()}
+
+
+MatchTable = ColumnarMatches if np is not None else DictMatches
+
+
+class MatchAnalytics:
+    """The match log loaded as a MatchTable, kept in step with the log.
+
+    The log is append-only, so a refresh reads only the lines after the
+    last offset seen; the table itself is rebuilt from the accumulated rows
+    once per change.
+    """
+
+    def __init__(self, log, table_class=None):
+        self.log = log
+        self.table_class = table_class or MatchTable
+        self._rows = []
+        self._offset = 0
+        self._table = None
+        self._lock = threading.Lock()
+
+    def table(self, offset):
+        """The table holding every log entry up to byte `offset`."""
+        with self._lock:
+            if self._table is None or self._offset != offset:
+                if offset < self._offset:
+                    # The log was replaced; start over
+                    self._rows, self._offset = [], 0
+                for match, end in self.log.read_from(self._offset):
+                    if end > offset:
+                        break
+                    self._rows.append(match)
+                    self._offset = end
+                self._table = self.table_class(self._rows)
+            return self._table
+
+    def query(self, offset, name, **params):
+        """Run analytics query `name`. Raises ValueError for an unknown query."""
+        if name not in ANALYTICS_QUERIES:
+            raise ValueError(f'Unknown query: {name}. Must be one of: {ANALYTICS_QUERIES}')
+        return getattr(self.table(offset), name)(**params)
+
+
+ANALYTICS = MatchAnalytics(MATCH_LOG)
+
+
+# ── Live updates (SSE) ────────────────────────────────────
+
+def changed_paths(old, new):
+    """Dotted paths of the leaf values that differ between two snapshots."""
+    a, b = old.index(), new.index()
+    return sorted(path for path in a.keys() | b.keys()
+                  if not (isinstance(a.get(path), dict) and isinstance(b.get(path), dict))
+                  and a.get(path) != b.get(path))
+
+
+def encode_event(event_id, event, payload):
+    data = json.dumps(payload, ensure_ascii=False)
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'.encode('utf-8')
+
+
+class SocketSubscriber:
+    """SSE subscriber on a raw non-blocking socket, with an outgoing buffer."""
+
+    MAX_BUFFER = 256 * 1024
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.buffer = bytearray()
+        self.alive = True
+
+    def send(self, data):
+        self.buffer += data
+        if len(self.buffer) > self.MAX_BUFFER:
+            # Client stopped reading; drop it rather than buffer forever
+            self.alive = False
+            return
+        self.flush()
+
+    def flush(self):
+        try:
+            while self.buffer:
+                sent = self.sock.send(self.buffer)
+                del self.buffer[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            self.alive = False
+
+    def close(self):
+        self.alive = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class AsyncSubscriber:
+    """SSE subscriber owned by the async engine's event loop."""
+
+    sock = None
+
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+        self.buffer = b''
+        self.alive = True
+
+    def send(self, data):
+        try:
+            self.loop.call_soon_threadsafe(self.writer.write, data)
+        except RuntimeError:
+            # Event loop already closed
+            self.alive = False
+
+    def close(self):
+        self.alive = False
+        try:
+            self.loop.call_soon_threadsafe(self.writer.close)
+        except RuntimeError:
+            pass
+
+
+class StreamHub:
+    """Fan-out of snapshot changes to /api/stats/stream subscribers.
+
+    One thread multiplexes every subscriber socket with a selector, so an
+    idle subscriber costs a file descriptor and a small buffer rather than a
+    thread. Recent events are kept for `Last-Event-ID` resume; a client that
+    asks for an older (or unknown) id gets a `snapshot` event instead.
+    """
+
+    def __init__(self, store, heartbeat=SSE_HEARTBEAT, max_subscribers=SSE_MAX_SUBSCRIBERS,
+                 history=100, poll_interval=1.0):
+        self.store = store
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self.poll_interval = poll_interval
+        self.history = deque(maxlen=history)
+        self.subscribers = set()
+        self._pending = deque()
+        self._thread = None
+        self._lock = threading.Lock()
+        store.add_listener(self._on_change)
+
+    def __len__(self):
+        return len(self.subscribers)
+
+    # Called from handler threads / the event loop
+
+    def subscribe_socket(self, sock, last_event_id=None):
+        """Hand `sock` (response headers already sent) over to the hub.
+        Returns False when the subscriber limit is reached."""
+        return self._subscribe(SocketSubscriber(sock), last_event_id)
+
+    def subscribe_async(self, loop, writer, last_event_id=None):
+        sub = AsyncSubscriber(loop, writer)
+        return sub if self._subscribe(sub, last_event_id) else None
+
+    def unsubscribe(self, sub):
+        self._call(self._remove, sub)
+
+    def _subscribe(self, sub, last_event_id):
+        if len(self.subscribers) >= self.max_subscribers:
+            return False
+        self._start()
+        self._call(self._add, sub, last_event_id)
+        return True
+
+    def _on_change(self, old, new):
+        if self._thread is not None:
+            self._call(self._publish, old, new)
+
+    def _call(self, fn, *args):
+        self._pending.append((fn, args))
+        try:
+            self._wake_w.send(b'x')
+        except (BlockingIOError, OSError):
+            pass
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._selector = selectors.DefaultSelector()
+            self._wake_r, self._wake_w = socket.socketpair()
+            self._wake_r.setblocking(False)
+            self._wake_w.setblocking(False)
+            self._selector.register(self._wake_r, selectors.EVENT_READ)
+            self._thread = threading.Thread(target=self._run, name='messi-sse', daemon=True)
+            self._thread.start()
+
+    # Hub thread
+
+    def _run(self):
+        now = time.monotonic()
+        next_heartbeat = now + self.heartbeat
+        next_poll = now + self.poll_interval
+        while True:
+            timeout = max(0.0, min(next_heartbeat, next_poll) - time.monotonic())
+            for key, mask in self._selector.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                sub = key.data
+                if mask & selectors.EVENT_READ:
+                    try:
+                        if not sub.sock.recv(4096):
+                            sub.alive = False
+                    except BlockingIOError:
+                        pass
+                    except OSError:
+                        sub.alive = False
+                if mask & selectors.EVENT_WRITE and sub.alive:
+                    sub.flush()
+                self._update(sub)
+
+            while self._pending:
+                fn, args = self._pending.popleft()
+                try:
+                    fn(*args)
+                except Exception as e:
+                    print(f'❌ SSE error: {e}')
+
+            now = time.monotonic()
+            if now >= next_poll:
+                next_poll = now + self.poll_interval
+                if self.subscribers:
+                    try:
+                        # Picks up external writers; changes arrive via _on_change
+                        self.store.get()
+                    except (OSError, ValueError):
+                        pass
+            if now >= next_heartbeat:
+                next_heartbeat = now + self.heartbeat
+                self._broadcast(b': ping\n\n')
+
+    def _update(self, sub):
+        """Sync the selector registration with the subscriber's state."""
+        if not sub.alive:
+            self._remove(sub)
+        elif sub.sock is not None:
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if sub.buffer else 0)
+            self._selector.modify(sub.sock, events, sub)
+
+    def _add(self, sub, last_event_id):
+        self.subscribers.add(sub)
+        if sub.sock is not None:
+            self._selector.register(sub.sock, selectors.EVENT_READ, sub)
+        sub.send(b'retry: 3000\n\n')
+        try:
+            snap = self.store.get()
+        except (OSError, ValueError):
+            snap = None
+        if snap is not None and last_event_id != str(snap.version):
+            replay = self._events_after(last_event_id)
+            if replay is None:
+                sub.send(encode_event(snap.version, 'snapshot', {
+                    'version': snap.version,
+                    'last_updated': snap.data.get('last_updated'),
+                    'career_totals': snap.data.get('career_totals', {}),
+                }))
+            else:
+                for _, event in replay:
+                    sub.send(event)
+        self._update(sub)
+
+    def _events_after(self, last_event_id):
+        """Stored events newer than `last_event_id`, or None if we cannot
+        tell what the client missed."""
+        try:
+            last = int(last_event_id)
+        except (TypeError, ValueError):
+            return None
+        if not self.history or self.history[0][0] > last + 1:
+            return None
+        if last > self.history[-1][0]:
+            # An id we never issued (e.g. from another worker process)
+            return None
+        return [item for item in self.history if item[0] > last]
+
+    def _remove(self, sub):
+        if sub not in self.subscribers:
+            return
+        self.subscribers.discard(sub)
+        if sub.sock is not None:
+            try:
+                self._selector.unregister(sub.sock)
+            except (KeyError, ValueError):
+                pass
+        sub.close()
+
+    def _publish(self, old, new):
+        changed = changed_paths(old, new)
+        if not changed:
+            return
+        event = encode_event(new.version, 'stats', {
+            'version': new.version,
+            'last_updated': new.data.get('last_updated'),
+            'changed': changed,
+            'career_totals': new.data.get('career_totals', {}),
+        })
+        self.history.append((new.version, event))
+        self._broadcast(event)
+
+    def _broadcast(self, data):
+        for sub in list(self.subscribers):
+            sub.send(data)
+            self._update(sub)
+
+
+STREAM_HUB = StreamHub(STORE)
+METRICS.callback('messi_sse_subscribers', 'gauge',
+                 'Open /api/stats/stream connections.', lambda server: len(STREAM_HUB))
+
+
+# ── Bot knowledge ─────────────────────────────────────────
+
+MONTHS_ES = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+             'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre']
+
+
+def team_summary(team):
+    """First-person summary of a team stint, as MessiBot expects it."""
+    if str(team.get('period', '')).endswith('presente'):
+        return (f"Con {team['name']} llevo {team['matches']} partidos, he marcado "
+                f"{team['goals']} goles, dado {team['assists']} asistencias y ganado "
+                f"{team['titles']} títulos.")
+    return (f"En {team['name']} jugué {team['matches']} partidos, marqué {team['goals']} "
+            f"goles, di {team['assists']} asistencias y gané {team['titles']} títulos.")
+
+
+def build_bot_data(data, today=None):
+    """Derive the /api/bot-data payload (MessiBot's knowledge base) from the stats."""
+    today = today or date.today()
+    totals = data.get('career_totals', {})
+    teams = data.get('teams', {})
+    info = data.get('personal_info', {})
+
+    current_team = info.get('current_team', '')
+    for team in teams.values():
+        if team.get('name') == current_team and team.get('period'):
+            current_team = f"{current_team} desde {team['period'].split('-')[0]}"
+            break
+
+    age = ''
+    try:
+        born = date.fromisoformat(info['birth_date'])
+        years = today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+        age = f'{years} años (nacido el {born.day} de {MONTHS_ES[born.month - 1]} de {born.year})'
+    except (KeyError, ValueError):
+        pass
+
+    return {
+        'metadata': {
+            'last_updated': data.get('last_updated'),
+            'source': data.get('data_source'),
+        },
+        'quick_answers': {
+            'total_goals': f"{totals.get('goals', 0)} goles en toda mi carrera profesional",
+            'total_matches': f"{totals.get('matches', 0)} partidos jugados",
+            'total_assists': f"{totals.get('assists', 0)} asistencias",
+            'total_titles': f"{totals.get('titles', 0)} títulos ganados en mi carrera",
+            'current_team': current_team,
+            'nationality': info.get('nationality', ''),
+            'position': info.get('position', ''),
+            'age': age,
+        },
+        'career_summary': {
+            'totals': totals,
+            'by_team': {
+                key: {
+                    'period': team.get('period'),
+                    'matches': team.get('matches', 0),
+                    'goals': team.get('goals', 0),
+                    'assists': team.get('assists', 0),
+                    'titles': team.get('titles', 0),
+                    'summary': team_summary(team),
+                }
+                for key, team in teams.items()
+            },
+        },
+        'titles_detail': data.get('titles_detail', {}),
+        'individual_awards': data.get('individual_awards', {}),
+        'records': data.get('records', {}),
+        'conversation_patterns': data.get('conversation_patterns', {}),
+    }
+
+
+def bot_data_key():
+    """Derived-cache key for the bot payload; it includes the age, so it also
+    changes daily."""
+    return 'bot-data:' + date.today().isoformat()
+
+
+def bot_data(snap):
+    """The bot knowledge base for `snap`, built once per key."""
+    return snap.derived(bot_data_key(), build_bot_data)
+
+
+# ── Question answering ────────────────────────────────────
+
+# Same intents, patterns and priority order as MessiBot.detectar_intencion
+BOT_INTENTS = [
+    ('goles_totales', r'cuantos goles|total.*goles|goles.*carrera|goles.*marcaste'),
+    ('goles_barcelona', r'goles.*barcelona|barcelona.*goles'),
+    ('goles_psg', r'goles.*psg|psg.*goles'),
+    ('goles_inter', r'goles.*inter|inter.*goles|goles.*miami'),
+    ('goles_argentina', r'goles.*argentina|argentina.*goles|goles.*seleccion'),
+    ('titulos_totales', r'cuantos titulos|total.*titulos|titulos.*carrera|titulos.*ganaste'),
+    ('champions', r'champions|champions league|copas de europa'),
+    ('mundial', r'mundial|copa del mundo|world cup'),
+    ('copa_america', r'copa america|copas america'),
+    ('balones_oro', r'balon.*oro|balones.*oro|ballons?.*or'),
+    ('partidos', r'cuantos partidos|partidos.*jugaste'),
+    ('asistencias', r'cuantas asistencias|asistencias'),
+    ('equipo_actual', r'donde juegas|equipo actual|juegas ahora'),
+    ('edad', r'cuantos anos|edad.*tienes|que edad'),
+]
+
+# Intent -> path of the answer inside the bot payload (as in MessiBot.responder)
+BOT_ANSWERS = {
+    'goles_totales': ('quick_answers', 'total_goals'),
+    'goles_barcelona': ('career_summary', 'by_team', 'barcelona', 'summary'),
+    'goles_psg': ('career_summary', 'by_team', 'psg', 'summary'),
+    'goles_inter': ('career_summary', 'by_team', 'inter_miami', 'summary'),
+    'goles_argentina': ('career_summary', 'by_team', 'argentina', 'summary'),
+    'titulos_totales': ('quick_answers', 'total_titles'),
+    'champions': ('titles_detail', 'by_competition', 'champions_league', 'answer'),
+    'mundial': ('titles_detail', 'by_competition', 'copa_mundial', 'answer'),
+    'copa_america': ('titles_detail', 'by_competition', 'copa_america', 'answer'),
+    'balones_oro': ('individual_awards', 'balon_oro', 'answer'),
+    'partidos': ('quick_answers', 'total_matches'),
+    'asistencias': ('quick_answers', 'total_assists'),
+    'equipo_actual': ('quick_answers', 'current_team'),
+    'edad': ('quick_answers', 'age'),
+}
+
+UNKNOWN_ANSWER = ('Lo siento, no entendí tu pregunta. Puedes preguntarme sobre mis goles, '
+                  'títulos, equipos y premios individuales.')
+
+_PUNCTUATION = re.compile(r'[^\w\s]+')
+
+
+def normalize_question(question):
+    """Lowercase, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize('NFKD', question.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(_PUNCTUATION.sub(' ', text).split())
+
+
+class IntentMatcher:
+    """All intent patterns compiled into one anchored regex.
+
+    Each alternative is a lookahead over the whole question, so the regex
+    engine tries them in table order and the first intent whose pattern
+    occurs anywhere wins — the same result as looping over `re.search`.
+    """
+
+    def __init__(self, intents):
+        self.names = [name for name, _ in intents]
+        alternatives = '|'.join(f'(?=.*?(?:{pattern}))(?P<i{n}>)'
+                                for n, (_, pattern) in enumerate(intents))
+        self.regex = re.compile(f'(?:{alternatives})', re.DOTALL)
+
+    def match(self, normalized):
+        m = self.regex.match(normalized)
+        if m is None:
+            return 'desconocido'
+        return self.names[int(m.lastgroup[1:])]
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+INTENTS = IntentMatcher(BOT_INTENTS)
+ANSWER_CACHE = LRUCache(int(os.environ.get('ANSWER_CACHE_SIZE') or 1024))
+ASK_BATCH_MAX = int(os.environ.get('ASK_BATCH_MAX') or 500)
+# Longer questions are rejected: matching is superlinear in the length, and
+# the normalized text is part of the ANSWER_CACHE key
+ASK_QUESTION_MAX = int(os.environ.get('ASK_QUESTION_MAX') or 500)
+
+
+def answer_for_intent(knowledge, intent):
+    node = knowledge
+    try:
+        for key in BOT_ANSWERS[intent]:
+            node = node[key]
+    except (KeyError, TypeError):
+        return UNKNOWN_ANSWER
+    return node
+
+
+def ask(snap, question):
+    """Answer `question` from `snap`: (intent, answer). Repeated questions are
+    served from ANSWER_CACHE, keyed by data version and normalized text
+    (cut to ASK_QUESTION_MAX, as NFKD can lengthen it)."""
+    normalized = normalize_question(question)[:ASK_QUESTION_MAX]
+    key = (snap.version, bot_data_key(), normalized)
+    cached = ANSWER_CACHE.get(key)
+    if cached is not None:
+        return cached
+    intent = INTENTS.match(normalized)
+    result = (intent, answer_for_intent(bot_data(snap), intent))
+    ANSWER_CACHE.put(key, result)
+    return result
+
+
+def ask_batch(snap, questions):
+    """Answer many questions at once.
+
+    Questions are normalized, deduplicated, and each distinct one is
+    answered once (from ANSWER_CACHE when possible). Questions over
+    ASK_QUESTION_MAX characters get an error item instead of an answer.
+    Returns the answers in input order plus a small stats dict with
+    per-phase timings.
+    """
+    started = time.perf_counter()
+    normalized = [normalize_question(q)[:ASK_QUESTION_MAX] if len(q) <= ASK_QUESTION_MAX else None
+                  for q in questions]
+    unique = dict.fromkeys(norm for norm in normalized if norm is not None)
+    normalized_at = time.perf_counter()
+
+    version, day = snap.version, bot_data_key()
+    knowledge = None
+    hits = 0
+    for norm in unique:
+        key = (version, day, norm)
+        result = ANSWER_CACHE.get(key)
+        if result is None:
+            if knowledge is None:
+                knowledge = bot_data(snap)
+            intent = INTENTS.match(norm)
+            result = (intent, answer_for_intent(knowledge, intent))
+            ANSWER_CACHE.put(key, result)
+        else:
+            hits += 1
+        unique[norm] = result
+    classified_at = time.perf_counter()
+
+    too_long = {'intent': None, 'error': f'Question too long (max {ASK_QUESTION_MAX} characters)'}
+    answers = [{'question': q, 'intent': unique[n][0], 'answer': unique[n][1]} if n is not None
+               else {'question': q, **too_long}
+               for q, n in zip(questions, normalized)]
+    finished = time.perf_counter()
+    stats = {
+        'count': len(questions),
+        'unique': len(unique),
+        'cache_hits': hits,
+        'timing_ms': {
+            'normalize': round((normalized_at - started) * 1000, 3),
+            'classify': round((classified_at - normalized_at) * 1000, 3),
+            'total': round((finished - started) * 1000, 3),
+        },
+    }
+    return answers, stats
+
+
+# ── Precompressed static assets ───────────────────────────
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json',
+                      'application/manifest+json', 'application/xml', 'image/svg+xml')
+MIN_COMPRESS_SIZE = 1024
+
+# Content-Encoding -> cache file suffix
+ENCODINGS = {'br': 'br', 'gzip': 'gz'} if brotli else {'gzip': 'gz'}
+
+
+def is_compressible(ctype, size):
+    return size >= MIN_COMPRESS_SIZE and ctype.startswith(COMPRESSIBLE_TYPES)
+
+
+def parse_accept_encoding(header):
+    """Return the encodings we support that the client accepts, best first."""
+    accepted = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return [enc for enc in ENCODINGS if accepted.get(enc, accepted.get('*', 0)) > 0]
+
+
+def parse_byte_ranges(header, size):
+    """Inclusive (start, end) pairs of a `Range: bytes=...` header for a
+    `size`-byte file, sorted, with overlapping ranges merged.
+
+    None if the header is malformed, not in bytes or asks for too many
+    ranges (the whole file is served); [] if no range overlaps the file (416).
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes':
+        return None
+    ranges = []
+    for item in spec.split(','):
+        first, dash, last = item.strip().partition('-')
+        first, last = first.strip(), last.strip()
+        if not dash or not (first or last) or not (first + last).isdigit():
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length and size:
+                ranges.append((max(0, size - length), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < size:
+            ranges.append((start, min(int(last), size - 1) if last else size - 1))
+    if len(ranges) > MAX_BYTE_RANGES:
+        return None
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def file_etag(mtime_ns, size):
+    """Strong ETag for a static file's own bytes, from its mtime and size (as
+    nginx does): the same whether it is served from memory or from disk."""
+    return f'"{mtime_ns:x}-{size:x}"'
+
+
+def compress(content, encoding, fast=False):
+    """`content` compressed with `encoding` ('gzip' or 'br'): maximum
+    compression for files compressed once, `fast` for per-version bodies."""
+    if encoding == 'br':
+        return brotli.compress(content, quality=5 if fast else 11)
+    return gzip.compress(content, compresslevel=6 if fast else 9, mtime=0)
+
+
+class StaticVariantCache:
+    """On-disk cache of gzip/brotli variants of static files.
+
+    Variants are stored as `<sha1 of source>.<gz|br>` and produced once per
+    content hash — lazily on first request or up front with --precompress.
+    The content hash of each source is remembered against its (mtime, size),
+    so a steady-state lookup costs one stat() of the source.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._index = {}
+
+    def variant(self, source, encoding):
+        """Return (path, digest) of `source` compressed with `encoding`, or None
+        if compression does not make the file smaller."""
+        st = os.stat(source)
+        key = (st.st_mtime_ns, st.st_size)
+        entry = self._index.get(source)
+        content = None
+        if entry is None or entry[0] != key:
+            with open(source, 'rb') as f:
+                content = f.read()
+            if entry is not None:
+                self._discard(entry[1])
+            entry = (key, hashlib.sha1(content).hexdigest())
+            self._index[source] = entry
+        digest = entry[1]
+        target = os.path.join(self.directory, f'{digest}.{ENCODINGS[encoding]}')
+        try:
+            size = os.path.getsize(target)
+        except FileNotFoundError:
+            if content is None:
+                with open(source, 'rb') as f:
+                    content = f.read()
+            size = self._write(target, compress(content, encoding))
+        if size >= st.st_size:
+            return None
+        return target, digest
+
+    def _write(self, target, data):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, target)
+        return len(data)
+
+    def _discard(self, digest):
+        """Drop the variants of a source version that no longer exists."""
+        for suffix in ENCODINGS.values():
+            try:
+                os.remove(os.path.join(self.directory, f'{digest}.{suffix}'))
+            except OSError:
+                pass
+
+    def precompress(self, root):
+        """Build step: create variants for every compressible file under root."""
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(('.', '_'))]
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                ctype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                if not is_compressible(ctype, os.path.getsize(path)):
+                    continue
+                for encoding in ENCODINGS:
+                    if self.variant(path, encoding):
+                        count += 1
+        return count
+
+
+STATIC_VARIANTS = StaticVariantCache(STATIC_CACHE_DIR)
+
+
+class CachedFile:
+    """A static file, or one compressed variant of it, held in memory with
+    its response headers already encoded."""
+
+    __slots__ = ('stamp', 'body', 'etag', 'last_modified', 'headers', 'validators')
+
+    def __init__(self, stamp, body, etag, ctype, encoding=None, vary=False):
+        self.stamp = stamp
+        self.body = body
+        self.etag = etag
+        self.last_modified = stamp[0] // 1_000_000_000
+        validators = f'ETag: {etag}\r\n' \
+                     f'Last-Modified: {email.utils.formatdate(self.last_modified, usegmt=True)}\r\n'
+        if vary:
+            validators += 'Vary: Accept-Encoding\r\n'
+        headers = f'Content-type: {ctype}\r\nContent-Length: {len(body)}\r\n'
+        if encoding:
+            headers += f'Content-Encoding: {encoding}\r\n'
+        else:
+            headers += 'Accept-Ranges: bytes\r\n'
+        self.validators = validators.encode('latin-1', 'strict')
+        self.headers = headers.encode('latin-1', 'strict') + self.validators
+
+
+class StaticFileCache:
+    """Size-capped LRU of small static files as bytes with prebuilt headers.
+
+    Entries are keyed by (path, encoding) and checked against the source's
+    (mtime, size) on every hit, so an edited file is picked up by the next
+    request. Files over `max_file_bytes` are never cached; the handler
+    streams them with sendfile() instead.
+    """
+
+    def __init__(self, max_bytes, max_file_bytes):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, path, st, ctype, encoding=None):
+        """The cached response for `path` (as stat()ed in `st`), loaded on a
+        miss. None if the file is too large, or the variant is not smaller."""
+        if st.st_size > self.max_file_bytes:
+            return None
+        key = (path, encoding)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stamp == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = self._load(path, stamp, ctype, encoding)
+        if entry is None:
+            return None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old.body)
+            self._entries[key] = entry
+            self.bytes += len(entry.body)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted.body)
+        return entry
+
+    def _load(self, path, stamp, ctype, encoding):
+        vary = is_compressible(ctype, stamp[1])
+        if encoding:
+            found = STATIC_VARIANTS.variant(path, encoding)
+            if found is None:
+                return None
+            target, digest = found
+            etag = f'"{digest[:20]}-{ENCODINGS[encoding]}"'
+        else:
+            target = path
+        with open(target, 'rb') as f:
+            body = f.read()
+        if not encoding:
+            etag = file_etag(*stamp)
+        return CachedFile(stamp, body, etag, ctype, encoding, vary)
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return round(self.hits / total, 4) if total else None
+
+    def __len__(self):
+        return len(self._entries)
+
+
+STATIC_FILES = StaticFileCache(STATIC_MEMORY_BYTES, STATIC_MEMORY_MAX_FILE)
+METRICS.callback('messi_static_cache_hits_total', 'counter',
+                 'Static responses served from memory.', lambda server: STATIC_FILES.hits)
+METRICS.callback('messi_static_cache_misses_total', 'counter',
+                 'Static cache lookups that had to read the file.',
+                 lambda server: STATIC_FILES.misses)
+METRICS.callback('messi_static_cache_hit_ratio', 'gauge',
+                 'hits / (hits + misses) since start.', lambda server: STATIC_FILES.hit_ratio())
+METRICS.callback('messi_static_cache_bytes', 'gauge',
+                 'Bytes of file content held by the static cache.',
+                 lambda server: STATIC_FILES.bytes)
+METRICS.callback('messi_static_cache_entries', 'gauge',
+                 'Files and compressed variants held by the static cache.',
+                 lambda server: len(STATIC_FILES))
+METRICS.describe('messi_static_sendfile_total', 'counter',
+                 'Static responses streamed with sendfile().')
+
+
+# ── Shared snapshot (multi-process) ───────────────────────
+
+class SharedEntry:
+    """The /api/stats response as published in a SharedSnapshot."""
+
+    __slots__ = ('seq', 'token', 'etag', 'last_modified', 'bodies')
+
+    def __init__(self, seq, token, etag, last_modified, bodies):
+        self.seq = seq
+        self.token = token
+        self.etag = etag
+        self.last_modified = last_modified
+        self.bodies = bodies
+
+
+class SharedSnapshot:
+    """The serialized stats (JSON body plus its gzip/brotli variants) in a
+    memory-mapped file shared by every worker process.
+
+    Whichever worker first sees a new version of the data publishes it;
+    the others serve /api/stats from the mapping without parsing, encoding
+    or compressing anything themselves.
+
+    The header holds a sequence number used as a seqlock: the publisher
+    makes it odd before touching the payload and even again after, and a
+    reader that sees it odd or changed across its copy retries, so a torn
+    read is never served. Publishers hold a file lock, so an odd number
+    seen under the lock means a publisher died mid-write: the next publish
+    overwrites the payload and makes the number even again.
+
+    Each process copies a published version out of the mapping once and
+    reuses it until the sequence number moves (serving straight from the
+    mapping could send a body that a publisher is overwriting). So the
+    saving is in CPU, not memory: every process still holds one copy of
+    the current bodies, and the other routes still parse their own
+    snapshot.
+    """
+
+    MAGIC = b'MESSISN1'
+    # magic, seq, last_modified, body / gzip / br lengths, token / etag lengths
+    HEADER = struct.Struct('<8sQqQQQHH')
+    TOKEN_AT = 128
+    ETAG_AT = 384
+    DATA_AT = 512
+    ENCODING_SLOTS = [None, 'gzip', 'br']
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < self.DATA_AT:
+            os.ftruncate(self._fd, self.DATA_AT)
+        self._map = mmap.mmap(self._fd, 0)
+        self._cache = None
+
+    @classmethod
+    def create(cls):
+        """A new segment in /dev/shm (or the temp dir), private to this server."""
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        return cls(os.path.join(directory, f'messi-stats-{os.getpid()}.snap'))
+
+    def remove(self):
+        for path in (self.path, self.path + '.lock'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _seq(self, mapping):
+        return struct.unpack_from('<Q', mapping, 8)[0]
+
+    def read(self):
+        """The published entry, or None if nothing was published yet."""
+        for _ in range(1000):
+            mapping = self._map
+            seq = self._seq(mapping)
+            cached = self._cache
+            if cached is not None and cached.seq == seq:
+                return cached
+            if seq == 0:
+                return None
+            if seq & 1:
+                # A publish is in progress
+                time.sleep(0)
+                continue
+            magic, _, last_modified, *lengths, token_len, etag_len = \
+                self.HEADER.unpack_from(mapping)
+            if magic != self.MAGIC:
+                return None
+            if self.DATA_AT + sum(lengths) > len(mapping):
+                # The publisher grew the file; map it again
+                self._map = mmap.mmap(self._fd, 0)
+                continue
+            view = memoryview(mapping)
+            try:
+                token = bytes(view[self.TOKEN_AT:self.TOKEN_AT + token_len]).decode()
+                etag = bytes(view[self.ETAG_AT:self.ETAG_AT + etag_len]).decode()
+                bodies = {}
+                offset = self.DATA_AT
+                for encoding, length in zip(self.ENCODING_SLOTS, lengths):
+                    if length:
+                        bodies[encoding] = bytes(view[offset:offset + length])
+                    offset += length
+            finally:
+                view.release()
+            if self._seq(mapping) != seq:
+                continue
+            entry = SharedEntry(seq, token, etag,
+                                last_modified if last_modified >= 0 else None, bodies)
+            self._cache = entry
+            return entry
+        return None
+
+    def publish(self, snap):
+        """Write `snap` into the segment (unless it already holds it)."""
+        token = repr(snap.token).encode()
+        etag = snap.etag.encode()
+        bodies = [snap.body] + [snap.encoded(enc) if enc in ENCODINGS else b''
+                                for enc in self.ENCODING_SLOTS[1:]]
+        with FileLock(self.path + '.lock'):
+            seq = self._seq(self._map)
+            if not seq & 1:
+                entry = self.read()
+                if entry is not None and entry.token == token.decode():
+                    return entry
+            size = self.DATA_AT + sum(len(body) for body in bodies)
+            if size > len(self._map):
+                os.ftruncate(self._fd, size)
+                self._map = mmap.mmap(self._fd, 0)
+            mapping = self._map
+            # Round an odd number left by a dead publisher up to even
+            seq = self._seq(mapping)
+            seq += seq & 1
+            struct.pack_into('<Q', mapping, 8, seq + 1)
+            self.HEADER.pack_into(mapping, 0, self.MAGIC, seq + 1,
+                                  snap.last_modified if snap.last_modified is not None else -1,
+                                  *(len(body) for body in bodies), len(token), len(etag))
+            mapping[self.TOKEN_AT:self.TOKEN_AT + len(token)] = token
+            mapping[self.ETAG_AT:self.ETAG_AT + len(etag)] = etag
+            offset = self.DATA_AT
+            for body in bodies:
+                mapping[offset:offset + len(body)] = body
+                offset += len(body)
+            struct.pack_into('<Q', mapping, 8, seq + 2)
+        return self.read()
+
+    def current(self, store):
+        """The entry for the store's current data, publishing it if the
+        segment holds an older version. None if the segment cannot be read
+        (the caller serves its own snapshot instead)."""
+        entry = self.read()
+        if entry is not None and entry.token == repr(store.backend.token()):
+            METRICS.inc('messi_snapshot_cache_total', ('shared', 'hit'))
+            return entry
+        METRICS.inc('messi_snapshot_cache_total', ('shared', 'miss'))
+        return self.publish(store.get())
+
+
+# Set by run() when several worker processes share the port
+SHARED_SNAPSHOT = None
+
+
+# ── Rate limiting ─────────────────────────────────────────
+
+def route_class(method, path):
+    """Rate-limit class of a request: 'admin' for writes, 'read' for the
+    other /api routes, None for static files."""
+    if not path.startswith('/api/'):
+        return None
+    if method == 'POST' and path != '/api/ask/batch':
+        return 'admin'
+    return 'read'
+
+
+class TokenBucketLimiter:
+    """Token buckets per (client, route class).
+
+    Each bucket refills at `rate` tokens per second up to `burst`; a
+    request takes one token. Buckets live in an LRU of at most
+    `max_buckets` entries, so memory stays bounded however many clients
+    show up: the evicted bucket is the one idle the longest, which would
+    have refilled anyway. `clock` is the time source (tests pass a fake one).
+    """
+
+    def __init__(self, limits, max_buckets, clock=time.monotonic):
+        self.limits = limits
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def acquire(self, client, route, now=None):
+        """Take a token; returns 0 if allowed, else seconds until one is available."""
+        rate, burst = self.limits.get(route, (0, 0))
+        if rate <= 0:
+            return 0
+        now = self.clock() if now is None else now
+        key = (client, route)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(burst), now]
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            self.limited += 1
+            return (1 - bucket[0]) / rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+RATE_LIMITER = TokenBucketLimiter(RATE_LIMITS, RATE_LIMIT_BUCKETS)
+METRICS.callback('messi_rate_limited_total', 'counter',
+                 'Requests answered 429 by the per-client rate limiter.',
+                 lambda server: RATE_LIMITER.limited)
+METRICS.callback('messi_rate_limit_buckets', 'gauge',
+                 'Client token buckets currently tracked.', lambda server: len(RATE_LIMITER))
+
+
+def overloaded_response(retry_after=1):
+    """A complete 503 response, sent by the engines when they shed load
+    before a handler ever runs."""
+    body = b'{"success": false, "error": "Servidor saturado, reintenta en unos segundos"}'
+    return (b'HTTP/1.1 503 Service Unavailable\r\n'
+            b'Content-Type: application/json; charset=utf-8\r\n'
+            b'Retry-After: %d\r\n'
+            b'Content-Length: %d\r\n'
+            b'Access-Control-Allow-Origin: *\r\n'
+            b'Connection: close\r\n\r\n' % (retry_after, len(body))) + body
+
+
+# ── Profiling ─────────────────────────────────────────────
+
+class RequestProfiler:
+    """cProfile over live traffic, switched on from the admin API.
+
+    A session profiles the next `requests` requests or the next `seconds`
+    seconds, whichever ends first, from the parsed request line to the end
+    of the handler (idle keep-alive time is never profiled). Requests are
+    profiled one at a time, since Python 3.12+ allows a single active
+    profiler per process; a request arriving while another is profiled is
+    simply not sampled. The profiles are merged into one pstats.Stats that
+    stays available until the next session starts.
+    """
+
+    SORT_KEYS = ('cumulative', 'tottime', 'ncalls', 'pcalls', 'filename', 'name')
+
+    def __init__(self):
+        self.active = False
+        self.stats = None
+        self.profiled = 0
+        self.remaining = None
+        self.deadline = None
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        # Held while a request is being profiled
+        self._sampling = threading.Lock()
+
+    def start(self, requests=None, seconds=None):
+        with self._lock:
+            self.stats = None
+            self.profiled = 0
+            self.remaining = requests
+            self.deadline = time.monotonic() + seconds if seconds else None
+            self.started_at = time.time()
+            self.finished_at = None
+            self.active = True
+
+    def stop(self):
+        with self._lock:
+            self._finish()
+
+    def _finish(self):
+        if self.active:
+            self.active = False
+            self.finished_at = time.time()
+
+    def _expire(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self._finish()
+
+    def begin(self):
+        """An enabled profile for this request, or None if it is not sampled."""
+        if not self._sampling.acquire(blocking=False):
+            return None
+        with self._lock:
+            self._expire()
+            active = self.active
+        if active:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                return profile
+            except ValueError:
+                # Another profiler is already active in this interpreter
+                pass
+        self._sampling.release()
+        return None
+
+    def end(self, profile):
+        profile.disable()
+        try:
+            with self._lock:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+                self.profiled += 1
+                if self.remaining is not None:
+                    self.remaining -= 1
+                    if self.remaining <= 0:
+                        self._finish()
+        finally:
+            self._sampling.release()
+
+    def status(self):
+        with self._lock:
+            self._expire()
+            return {
+                'active': self.active,
+                'profiled_requests': self.profiled,
+                'remaining_requests': self.remaining if self.active else None,
+                'seconds_left': (round(max(0, self.deadline - time.monotonic()), 1)
+                                 if self.active and self.deadline else None),
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'pid': os.getpid(),
+            }
+
+    def report(self, sort='cumulative', top=30):
+        """Text top-`top` report of the merged profile, or None if there is none."""
+        with self._lock:
+            if self.stats is None:
+                return None
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats(sort).print_stats(top)
+            return out.getvalue()
+
+    def dump(self):
+        """The merged profile in pstats' file format (pstats.Stats(path) reads it)."""
+        with self._lock:
+            return None if self.stats is None else marshal.dumps(self.stats.stats)
+
+
+class AllocationTracker:
+    """tracemalloc snapshots of the running server, compared pairwise."""
+
+    KEYS = ('lineno', 'filename', 'traceback')
+
+    def __init__(self):
+        self.previous = None
+        self.latest = None
+
+    def start(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.previous = self.latest = None
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def snapshot(self):
+        """Take a snapshot; the one before it becomes the diff baseline."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('tracemalloc is not running; start it first')
+        snap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        self.previous, self.latest = self.latest, snap
+        return snap
+
+    def status(self):
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'tracing': tracemalloc.is_tracing(),
+            'traced_bytes': current,
+            'peak_bytes': peak,
+            'snapshots': (self.previous is not None) + (self.latest is not None),
+            'pid': os.getpid(),
+        }
+
+    def report(self, top=20, key='lineno'):
+        """Largest allocation sites in the latest snapshot and, if there is
+        an earlier one, what grew in between. None without a snapshot."""
+        if self.latest is None:
+            return None
+        lines = [f'Top {top} allocation sites by {key}:']
+        lines += [str(line) for line in self.latest.statistics(key)[:top]]
+        if self.previous is not None:
+            lines += ['', f'Top {top} changes since the previous snapshot:']
+            lines += [str(line) for line in self.latest.compare_to(self.previous, key)[:top]]
+        return '\n'.join(lines) + '\n'
+
+
+PROFILER = RequestProfiler()
+ALLOCATIONS = AllocationTracker()
+
+
+class MasterHandler(http.server.SimpleHTTPRequestHandler):
+    """Unified handler for all requests."""
+
+    # Keep-alive settings; build_server() switches protocol_version to
+    # HTTP/1.1 when persistent connections are enabled.
+    idle_timeout = KEEP_ALIVE_IDLE_TIMEOUT
+    max_requests = KEEP_ALIVE_MAX_REQUESTS
+    requests_served = 0
+    # Headers and body go out in separate writes; with Nagle on, the body
+    # waits for the client's delayed ACK (~40 ms) on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    # ── Connection handling ───────────────────────────────
+
+    def handle(self):
+        """Serve requests until the client closes, goes idle, or hits the cap."""
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            self.requests_served += 1
+            # Wait for the next request with the (shorter) idle timeout
+            self.connection.settimeout(self.idle_timeout)
+            self.handle_one_request()
+
+    def parse_request(self):
+        if self.requests_served and hasattr(self, 'connection'):
+            self.connection.settimeout(self.timeout)
+        # The request line has arrived; time from here, not from idle waiting
+        self.request_started = time.perf_counter()
+        METRICS.request_started()
+        if SERVER_TIMING or SERVER_TIMING_LOG:
+            self.timer = _request_timing.timer = PhaseTimer()
+        if PROFILER.active:
+            self.profile = PROFILER.begin()
+        return super().parse_request()
+
+    def handle_one_request(self):
+        self.request_started = None
+        self.response_status = None
+        self.response_bytes = 0
+        self.timer = None
+        self.headers_sent_at = None
+        self.profile = None
+        try:
+            super().handle_one_request()
+        finally:
+            if self.profile is not None:
+                PROFILER.end(self.profile)
+            if self.request_started is not None:
+                self.record_request()
+            if self.timer is not None:
+                _request_timing.timer = None
+                self.log_timing()
+
+    def record_request(self):
+        method = self.command if self.command in ('GET', 'HEAD', 'POST', 'OPTIONS') else 'other'
+        METRICS.request_finished(route_label(getattr(self, 'path', '').split('?', 1)[0]),
+                                 method, self.response_status,
+                                 time.perf_counter() - self.request_started,
+                                 0 if method == 'HEAD' else self.response_bytes)
+
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword == 'Content-Length':
+            self.response_bytes = int(value)
+        super().send_header(keyword, value)
+
+    def log_timing(self):
+        """Close the request's phases (the body write is everything after the
+        headers) and emit the structured log line if enabled."""
+        timer = self.timer
+        if self.headers_sent_at is not None:
+            timer.add('write', time.perf_counter() - self.headers_sent_at)
+        if not SERVER_TIMING_LOG or self.response_status is None:
+            return
+        entry = {
+            'time': datetime.now().isoformat(timespec='milliseconds'),
+            'client': self.client_address[0],
+            'method': self.command,
+            'path': self.path,
+            'status': self.response_status,
+            'bytes': self.response_bytes,
+            'ms': round(timer.elapsed() * 1000, 3),
+            'phases': {name: round(seconds * 1000, 3) for name, seconds in timer.phases.items()},
+        }
+        sys.stderr.write(json.dumps(entry) + '\n')
 
+    def keep_alive_allowed(self):
+        """False when this response must be the last one on the connection."""
+        if self.requests_served + 1 >= self.max_requests:
+            return False
+        saturated = getattr(self.server, 'saturated', None)
+        return not (saturated and saturated())
 
-class MasterHandler(http.server.SimpleHTTPRequestHandler):
-    """Unified handler for all requests."""
+    def end_headers(self):
+        if not self.close_connection:
+            if not self.keep_alive_allowed():
+                self.send_header('Connection', 'close')
+            elif self.request_version == 'HTTP/1.0':
+                self.send_header('Connection', 'keep-alive')
+        # Not for the interim "100 Continue" (no send_response() yet)
+        if self.timer is not None and self.response_status is not None:
+            if SERVER_TIMING:
+                self.send_header('Server-Timing', self.timer.header())
+                self.send_header('Timing-Allow-Origin', '*')
+            super().end_headers()
+            self.headers_sent_at = time.perf_counter()
+            return
+        super().end_headers()
 
     def log_message(self, fmt, *args):
         """Custom logging — only log API calls and errors."""
-        path = args[0].split()[1] if args else ''
+        parts = str(args[0]).split() if args else []
+        path = parts[1] if len(parts) > 1 else ''
         if '/api/' in str(path) or '404' in str(args):
             super().log_message(fmt, *args)
 
@@ -40,64 +2965,553 @@ class MasterHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
 
+    # ── Conditional GET ───────────────────────────────────
+
+    def is_not_modified(self, etag, last_modified):
+        """Evaluate If-None-Match / If-Modified-Since against a validator pair."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [t.strip() for t in if_none_match.split(',')]
+            return '*' in tags or etag in tags or ('W/' + etag) in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since and last_modified is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+                return since.timestamp() >= last_modified
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+        return False
+
+    def send_validators(self, etag, last_modified):
+        self.send_header('ETag', etag)
+        if last_modified is not None:
+            self.send_header('Last-Modified', email.utils.formatdate(last_modified, usegmt=True))
+        self.send_header('Cache-Control', 'no-cache')
+
+    def send_static_validators(self, etag, last_modified, vary):
+        """Validators of a static file, identical on its 200, 206 and 304
+        responses (and in CachedFile's prebuilt headers). No Cache-Control:
+        unlike the API, static files keep the browser's default caching."""
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', email.utils.formatdate(last_modified, usegmt=True))
+        if vary:
+            self.send_header('Vary', 'Accept-Encoding')
+
+    def send_not_modified(self, etag, last_modified):
+        self.send_response(304)
+        self.send_validators(etag, last_modified)
+        self.send_cors_headers()
+        self.end_headers()
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_cors_headers()
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     # ── Auth ──────────────────────────────────────────────
 
     def check_admin_auth(self):
         """Check HTTP Basic Auth for admin endpoints."""
-        auth_header = self.headers.get('Authorization', '')
-        if not auth_header.startswith('Basic '):
-            return False
-        try:
-            decoded = base64.b64decode(auth_header[6:]).decode('utf-8')
-            user, passwd = decoded.split(':', 1)
-            return user == ADMIN_USER and passwd == ADMIN_PASS
-        except Exception:
-            return False
+        with timed('auth'):
+            auth_header = self.headers.get('Authorization', '')
+            if not auth_header.startswith('Basic '):
+                return False
+            try:
+                decoded = base64.b64decode(auth_header[6:]).decode('utf-8')
+                user, passwd = decoded.split(':', 1)
+                return user == ADMIN_USER and passwd == ADMIN_PASS
+            except Exception:
+                return False
 
     def require_auth(self):
         """Send 401 if not authenticated."""
+        body = b'<html><body><h1>401 - Autenticacion requerida</h1></body></html>'
         self.send_response(401)
         self.send_header('WWW-Authenticate', 'Basic realm="Admin Panel"')
         self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        if int(self.headers.get('Content-Length') or 0):
+            # The unread request body would be parsed as the next request
+            self.send_header('Connection', 'close')
         self.end_headers()
-        self.wfile.write(b'<html><body><h1>401 - Autenticacion requerida</h1></body></html>')
+        self.wfile.write(body)
+
+    # ── Rate limiting ─────────────────────────────────────
+
+    def client_ip(self):
+        if RATE_LIMIT_TRUST_PROXY:
+            forwarded = self.headers.get('X-Forwarded-For', '').rsplit(',', 1)[-1].strip()
+            if forwarded:
+                return forwarded
+        return self.client_address[0]
+
+    def rate_limited(self, path):
+        """Send 429 and return True if this client is over its limit for the route."""
+        route = route_class(self.command, path)
+        if route is None:
+            return False
+        wait = RATE_LIMITER.acquire(self.client_ip(), route)
+        if not wait:
+            return False
+        headers = {'Retry-After': str(max(1, int(wait + 0.999)))}
+        if int(self.headers.get('Content-Length') or 0):
+            # The unread request body would be parsed as the next request
+            headers['Connection'] = 'close'
+        self.send_json_response({'success': False, 'error': 'Demasiadas peticiones'}, 429, headers)
+        return True
 
     # ── GET routes ────────────────────────────────────────
 
     def do_GET(self):
         parsed = urlparse(self.path)
         path = parsed.path
+        if self.rate_limited(path):
+            return
 
         # API endpoints
         if path == '/api/stats':
+            fields = parse_qs(parsed.query, keep_blank_values=True).get('fields')
+            if fields is not None:
+                return self.serve_projection(','.join(fields))
+            return self.serve_stats()
+        elif path == '/api/stats/stream':
+            return self.serve_stream()
+        elif path == '/api/teams' or path.startswith('/api/teams/'):
+            return self.serve_team(path[len('/api/teams'):].strip('/'))
+        elif path == '/' + STATS_FILE and STORE.backend.name != 'json':
+            # The file on disk is not the source of truth; serve the live data
             return self.serve_stats()
+        elif path == '/api/analytics':
+            return self.serve_analytics(parse_qs(parsed.query))
+        elif path == '/api/views' or path.startswith('/api/views/'):
+            return self.serve_view(path[len('/api/views'):].strip('/'))
         elif path == '/api/status':
             return self.serve_status()
+        elif path == '/api/metrics':
+            return self.serve_metrics()
+        elif path == '/api/profile' or path.startswith('/api/profile/'):
+            if not self.check_admin_auth():
+                return self.require_auth()
+            return self.serve_profile(path[len('/api/profile'):].strip('/'),
+                                      parse_qs(parsed.query))
+        elif path == '/api/bot-data':
+            return self.serve_bot_data()
+        elif path == '/api/ask':
+            return self.serve_ask(parse_qs(parsed.query).get('q', [''])[0])
         elif path == '/admin' or path == '/admin/':
             # Check auth for admin panel
             if not self.check_admin_auth():
                 return self.require_auth()
             self.path = '/admin/index.html'
-            return super().do_GET()
+            return self.serve_static() or super().do_GET()
         else:
             # Serve static files
-            return super().do_GET()
+            return self.serve_static() or super().do_GET()
+
+    def serve_static(self):
+        """Answer a static GET: byte ranges when asked, small files from
+        STATIC_FILES. False (nothing sent) for directories, errors and whole
+        large files, which take the regular path."""
+        if self.request_version == 'HTTP/0.9':
+            # No header buffer to append the prebuilt headers to
+            return False
+        path = self.translate_path(self.path)
+        if self.path.split('?', 1)[0].split('#', 1)[0].endswith('/'):
+            path = os.path.join(path, 'index.html')
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if not stat.S_ISREG(st.st_mode):
+            return False
+        ctype = self.guess_type(path)
+        range_header = self.headers.get('Range')
+        if range_header is not None and self.serve_ranges(path, st, ctype, range_header):
+            return True
+        if st.st_size > STATIC_FILES.max_file_bytes:
+            return False
+        entry = None
+        accept = self.headers.get('Accept-Encoding', '')
+        try:
+            if accept and is_compressible(ctype, st.st_size):
+                for encoding in parse_accept_encoding(accept):
+                    entry = STATIC_FILES.lookup(path, st, ctype, encoding)
+                    if entry is not None:
+                        break
+            if entry is None:
+                entry = STATIC_FILES.lookup(path, st, ctype)
+        except OSError:
+            return False
+        if entry is None:
+            return False
+        if self.is_not_modified(entry.etag, entry.last_modified):
+            self.send_response(304)
+            self._headers_buffer.append(entry.validators)
+            self.end_headers()
+            return True
+        self.send_response(200)
+        self._headers_buffer.append(entry.headers)
+        self.response_bytes = len(entry.body)
+        self.end_headers()
+        self.wfile.write(entry.body)
+        return True
+
+    # ── Byte ranges ───────────────────────────────────────
+
+    def serve_ranges(self, path, st, ctype, range_header):
+        """206/416 for a Range request on the file's own bytes (ranges never
+        apply to compressed variants). False if the Range is ignored because
+        it is malformed or If-Range no longer matches: the whole file goes out."""
+        try:
+            entry = STATIC_FILES.lookup(path, st, ctype)
+        except OSError:
+            return False
+        if entry is not None:
+            etag, last_modified = entry.etag, entry.last_modified
+        else:
+            etag = file_etag(st.st_mtime_ns, st.st_size)
+            last_modified = st.st_mtime_ns // 1_000_000_000
+        if not self.if_range_matches(etag, last_modified):
+            return False
+        ranges = parse_byte_ranges(range_header, st.st_size)
+        if ranges is None:
+            return False
+        if not ranges:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{st.st_size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return True
+        if entry is not None:
+            body = memoryview(entry.body)
+            self.send_ranges(ranges, st.st_size, ctype, etag, last_modified,
+                             lambda start, length: self.wfile.write(body[start:start + length]))
+            return True
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return False
+        with f:
+            self.send_ranges(ranges, st.st_size, ctype, etag, last_modified,
+                             lambda start, length: self.write_file_range(f, start, length))
+        return True
+
+    def if_range_matches(self, etag, last_modified):
+        """True if there is no If-Range, or it still names this file: a strong
+        ETag compared exactly, or a date equal to Last-Modified."""
+        if_range = self.headers.get('If-Range')
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith(('"', 'W/')):
+            return if_range == etag
+        try:
+            return email.utils.parsedate_to_datetime(if_range).timestamp() == last_modified
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+
+    def send_ranges(self, ranges, size, ctype, etag, last_modified, write):
+        """206 with one range as the body, or several as multipart/byteranges;
+        `write(start, length)` sends that slice of the file."""
+        vary = is_compressible(ctype, size)
+        self.send_response(206)
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.send_header('Content-type', ctype)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_static_validators(etag, last_modified, vary)
+            self.end_headers()
+            write(start, end - start + 1)
+            return
+        boundary = os.urandom(12).hex()
+        parts = [f'\r\n--{boundary}\r\nContent-Type: {ctype}\r\n'
+                 f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n'.encode('latin-1')
+                 for start, end in ranges]
+        closing = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+        length = (sum(map(len, parts)) + len(closing)
+                  + sum(end - start + 1 for start, end in ranges))
+        self.send_header('Content-type', f'multipart/byteranges; boundary={boundary}')
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_static_validators(etag, last_modified, vary)
+        self.end_headers()
+        for head, (start, end) in zip(parts, ranges):
+            self.wfile.write(head)
+            write(start, end - start + 1)
+        self.wfile.write(closing)
+
+    def write_file_range(self, f, start, length):
+        """Send `length` bytes of `f` from `start` without reading the rest:
+        sendfile() on socket engines, an mmap slice on the buffered one."""
+        if self.use_sendfile:
+            METRICS.inc('messi_static_sendfile_total')
+            self.connection.sendfile(f, start, length)
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            self.wfile.write(view[start:start + length])
+
+    # Stream uncached files with sendfile() (zero-copy, socket engines only)
+    use_sendfile = hasattr(os, 'sendfile')
+
+    def copyfile(self, source, outputfile):
+        # Directory listings arrive as BytesIO; only real files have a descriptor
+        if self.use_sendfile and outputfile is self.wfile and isinstance(source, io.BufferedReader):
+            METRICS.inc('messi_static_sendfile_total')
+            # socket.sendfile() honours the connection timeout, unlike a
+            # bare os.sendfile() on a socket with a timeout set
+            self.connection.sendfile(source)
+            return
+        super().copyfile(source, outputfile)
+
+    def send_head(self):
+        """Open a static file and send its headers: a precompressed variant
+        when the client accepts one, else the file itself with Accept-Ranges."""
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.split('?', 1)[0].endswith('/'):
+            path = os.path.join(path, 'index.html')
+        try:
+            st = os.stat(path)
+        except OSError:
+            return super().send_head()
+        if not stat.S_ISREG(st.st_mode):
+            return super().send_head()
+        ctype = self.guess_type(path)
+        accept = self.headers.get('Accept-Encoding', '')
+        if not accept or not is_compressible(ctype, st.st_size):
+            return self.send_file_head(path, st, ctype)
+        for encoding in parse_accept_encoding(accept):
+            found = STATIC_VARIANTS.variant(path, encoding)
+            if found:
+                break
+        else:
+            return self.send_file_head(path, st, ctype)
+        target, digest = found
+        try:
+            f = open(target, 'rb')
+        except OSError:
+            return self.send_file_head(path, st, ctype)
+
+        etag = f'"{digest[:20]}-{ENCODINGS[encoding]}"'
+        last_modified = st.st_mtime_ns // 1_000_000_000
+        if self.is_not_modified(etag, last_modified):
+            f.close()
+            self.send_response(304)
+            self.send_static_validators(etag, last_modified, True)
+            self.end_headers()
+            return None
+        self.send_response(200)
+        self.send_header('Content-type', ctype)
+        self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+        self.send_static_validators(etag, last_modified, True)
+        self.end_headers()
+        return f
+
+    def send_file_head(self, path, st, ctype):
+        """send_head() for the file's own bytes, which can be asked for in ranges."""
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, 'File not found')
+            return None
+        etag = file_etag(st.st_mtime_ns, st.st_size)
+        last_modified = st.st_mtime_ns // 1_000_000_000
+        vary = is_compressible(ctype, st.st_size)
+        if self.is_not_modified(etag, last_modified):
+            f.close()
+            self.send_response(304)
+            self.send_static_validators(etag, last_modified, vary)
+            self.end_headers()
+            return None
+        self.send_response(200)
+        self.send_header('Content-type', ctype)
+        self.send_header('Content-Length', str(st.st_size))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_static_validators(etag, last_modified, vary)
+        self.end_headers()
+        return f
 
     def serve_stats(self):
-        """Serve messi-stats.json via API."""
+        """Serve messi-stats.json via API, compressed if the client accepts it.
+
+        With several worker processes the bodies come from the shared
+        snapshot, so only one process serializes and compresses each version.
+        """
         try:
-            with open(STATS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            entry = SHARED_SNAPSHOT.current(STORE) if SHARED_SNAPSHOT is not None else None
+            if entry is not None:
+                etag, last_modified, body_for = entry.etag, entry.last_modified, entry.bodies.get
+            else:
+                snap = STORE.get()
+                etag, last_modified = snap.etag, snap.last_modified
+                body_for = lambda encoding: snap.encoded(encoding) if encoding else snap.body
+            encoding = next(iter(parse_accept_encoding(self.headers.get('Accept-Encoding', ''))),
+                            None)
+            if encoding:
+                etag = etag[:-1] + '-' + ENCODINGS[encoding] + '"'
+            if self.is_not_modified(etag, last_modified):
+                return self.send_not_modified(etag, last_modified)
+            body = body_for(encoding)
             self.send_response(200)
             self.send_header('Content-type', 'application/json; charset=utf-8')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_validators(etag, last_modified)
             self.send_cors_headers()
             self.end_headers()
-            self.wfile.write(json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+            self.wfile.write(body)
+        except FileNotFoundError:
+            self.send_error(404, 'Stats file not found')
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def send_snapshot_body(self, snap, body, etag):
+        """Send a JSON body derived from `snap`, honouring conditional GET."""
+        if self.is_not_modified(etag, snap.last_modified):
+            return self.send_not_modified(etag, snap.last_modified)
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_validators(etag, snap.last_modified)
+        self.send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def derived_etag(self, snap, key):
+        return '"' + snap.etag.strip('"') + '-' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:8] + '"'
+
+    def serve_projection(self, fields):
+        """Serve /api/stats?fields=a,b.c — only the requested paths."""
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+        if not fields:
+            return self.send_error(400, 'No field names in ?fields=')
+        try:
+            snap = STORE.get()
+            try:
+                body = snap.project(fields)
+            except KeyError as e:
+                return self.send_error(400, f'Unknown field: {e.args[0]}')
+            self.send_snapshot_body(snap, body, self.derived_etag(snap, ','.join(sorted(set(fields)))))
+        except FileNotFoundError:
+            self.send_error(404, 'Stats file not found')
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def serve_team(self, subpath):
+        """Serve /api/teams, /api/teams/<team> and /api/teams/<team>/<field>."""
+        key = '.'.join(['teams'] + [p for p in subpath.split('/') if p])
+        try:
+            snap = STORE.get()
+            try:
+                body = snap.fragment(key)
+            except KeyError:
+                return self.send_error(404, f'Not found: {subpath}')
+            self.send_snapshot_body(snap, body, self.derived_etag(snap, key))
+        except FileNotFoundError:
+            self.send_error(404, 'Stats file not found')
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def serve_view(self, name):
+        """Serve /api/views (every derived view) or /api/views/<name>."""
+        try:
+            snap = STORE.get()
+            views = snap.views()
+            if name and name not in views.views:
+                return self.send_error(404, f'Unknown view: {name}')
+            key = 'view:' + name
+            body = snap.derived(key, lambda data: json.dumps(
+                views.result(name) if name else {n: views.result(n) for n in views.views},
+                ensure_ascii=False).encode('utf-8'))
+            self.send_snapshot_body(snap, body, self.derived_etag(snap, key))
+        except FileNotFoundError:
+            self.send_error(404, 'Stats file not found')
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def serve_analytics(self, query):
+        """Serve /api/analytics?q=<query>[&team=..][&competition=..][&window=N]
+        over the match log, computed once per data version."""
+        name = query.get('q', ['goals_by_year_competition'])[0]
+        params = {key: query[key][0] for key in ('team', 'competition') if key in query}
+        try:
+            if name == 'rolling_goal_rate':
+                params['window'] = int(query.get('window', ['10'])[0])
+                if params['window'] < 1:
+                    raise ValueError('window must be positive')
+            if name not in ANALYTICS_QUERIES:
+                raise ValueError(f'Unknown query: {name}. Must be one of: {ANALYTICS_QUERIES}')
+        except ValueError as e:
+            return self.send_error(400, str(e))
+        try:
+            snap = STORE.get()
+            offset = snap.data.get('match_log', {}).get('offset', 0)
+            key = 'analytics:' + name + ':' + json.dumps(params, sort_keys=True)
+            body = snap.derived(key, lambda data: json.dumps({
+                'query': name,
+                'engine': ANALYTICS.table_class.engine,
+                'matches': len(ANALYTICS.table(offset)),
+                'result': ANALYTICS.query(offset, name, **params),
+            }, ensure_ascii=False).encode('utf-8'))
+            self.send_snapshot_body(snap, body, self.derived_etag(snap, key))
+        except FileNotFoundError:
+            self.send_error(404, 'Stats file not found')
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def serve_bot_data(self):
+        """Serve the bot knowledge base, built once per data version (and day,
+        since it includes the age)."""
+        try:
+            snap = STORE.get()
+            key = bot_data_key() + ':json'
+            body = snap.derived(key, lambda data: json.dumps(
+                bot_data(snap), ensure_ascii=False).encode('utf-8'))
+            self.send_snapshot_body(snap, body, self.derived_etag(snap, key))
+        except FileNotFoundError:
+            self.send_error(404, 'Stats file not found')
+        except Exception as e:
+            self.send_error(500, str(e))
+
+    def serve_stream(self):
+        """Server-Sent Events: push a `stats` event whenever the data changes."""
+        if len(STREAM_HUB) >= STREAM_HUB.max_subscribers:
+            return self.send_error(503, 'Too many stream subscribers')
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        self.send_cors_headers()
+        # The stream ends when either side closes the connection
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.flush()
+        self.start_stream(self.headers.get('Last-Event-ID'))
+
+    def start_stream(self, last_event_id):
+        """Hand the connection to STREAM_HUB so no worker thread waits on it."""
+        if (self.server.detach(self.request)
+                and not STREAM_HUB.subscribe_socket(self.request, last_event_id)):
+            # Another subscriber took the last slot since serve_stream()
+            # checked; the headers are out, so just close the connection
+            self.server.reattach(self.request)
+
+    def serve_ask(self, question):
+        """Answer a single question: /api/ask?q=..."""
+        if not question.strip():
+            return self.send_error(400, 'Missing query parameter: q')
+        if len(question) > ASK_QUESTION_MAX:
+            return self.send_error(400, f'Question too long (max {ASK_QUESTION_MAX} characters)')
+        try:
+            snap = STORE.get()
+            with timed('compute'):
+                intent, answer = ask(snap, question)
+            self.send_json_response({'question': question, 'intent': intent, 'answer': answer})
         except FileNotFoundError:
             self.send_error(404, 'Stats file not found')
         except Exception as e:
@@ -106,8 +3520,12 @@ class MasterHandler(http.server.SimpleHTTPRequestHandler):
     def serve_status(self):
         """Serve server status."""
         try:
-            with open(STATS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            snap = STORE.get()
+            # Status only changes with the document (besides its timestamp)
+            etag = '"status-' + snap.etag.strip('"') + '"'
+            if self.is_not_modified(etag, snap.last_modified):
+                return self.send_not_modified(etag, snap.last_modified)
+            data = snap.data
             status = {
                 'status': 'online',
                 'server': 'Messi Stats Unified Server',
@@ -116,19 +3534,106 @@ class MasterHandler(http.server.SimpleHTTPRequestHandler):
                 'career_totals': data.get('career_totals', {}),
                 'timestamp': datetime.now().isoformat()
             }
+            with timed('serialize'):
+                body = json.dumps(status, ensure_ascii=False, indent=2).encode('utf-8')
             self.send_response(200)
             self.send_header('Content-type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_validators(etag, snap.last_modified)
             self.send_cors_headers()
             self.end_headers()
-            self.wfile.write(json.dumps(status, ensure_ascii=False, indent=2).encode('utf-8'))
+            self.wfile.write(body)
         except Exception as e:
             self.send_error(500, str(e))
 
+    def serve_metrics(self):
+        """Serve counters and latency histograms in Prometheus text format."""
+        self.send_body(METRICS.render(self.server).encode('utf-8'),
+                       'text/plain; version=0.0.4; charset=utf-8')
+
+    def serve_profile(self, sub, query):
+        """Profiler results: status (JSON), report / memory (text), pstats (download)."""
+        try:
+            top = int(query.get('top', ['30'])[0])
+        except ValueError:
+            return self.send_error(400, 'top must be an integer')
+        if sub == '':
+            return self.send_json_response({'cpu': PROFILER.status(),
+                                            'memory': ALLOCATIONS.status()})
+        if sub == 'report':
+            sort = query.get('sort', ['cumulative'])[0]
+            if sort not in PROFILER.SORT_KEYS:
+                return self.send_error(400, f'sort must be one of {PROFILER.SORT_KEYS}')
+            report = PROFILER.report(sort, top)
+        elif sub == 'memory':
+            key = query.get('key', ['lineno'])[0]
+            if key not in ALLOCATIONS.KEYS:
+                return self.send_error(400, f'key must be one of {ALLOCATIONS.KEYS}')
+            report = ALLOCATIONS.report(top, key)
+        elif sub == 'pstats':
+            dump = PROFILER.dump()
+            if dump is None:
+                return self.send_error(404, 'No profile yet; POST /api/profile to start one')
+            return self.send_body(dump, 'application/octet-stream', {
+                'Content-Disposition': f'attachment; filename="messi-{os.getpid()}.pstats"'})
+        else:
+            return self.send_error(404, 'Endpoint not found')
+        if report is None:
+            return self.send_error(404, 'Nothing recorded yet')
+        self.send_body(report.encode('utf-8'), 'text/plain; charset=utf-8')
+
+    def control_profile(self, sub):
+        """Start/stop CPU profiling, or drive tracemalloc.
+
+        POST /api/profile          {"requests": N} and/or {"seconds": T}
+        POST /api/profile/stop
+        POST /api/profile/memory   {"action": "start" | "snapshot" | "stop", "frames": N}
+        """
+        try:
+            payload = self.read_post_body() if int(self.headers.get('Content-Length') or 0) else {}
+            if not isinstance(payload, dict):
+                raise ValueError('expected an object')
+        except ValueError as e:
+            return self.send_error(400, f'Invalid JSON: {e}')
+        if sub == '':
+            requests, seconds = payload.get('requests'), payload.get('seconds')
+            if requests is None and seconds is None:
+                requests = 100
+            if not all(v is None or (isinstance(v, (int, float)) and v > 0)
+                       for v in (requests, seconds)):
+                return self.send_error(400, 'requests and seconds must be positive numbers')
+            PROFILER.start(int(requests) if requests else None, seconds)
+            print(f'🔬 Profiling started ({requests or "any"} requests, {seconds or "no"} time limit)')
+            return self.send_json_response({'success': True, 'cpu': PROFILER.status()})
+        if sub == 'stop':
+            PROFILER.stop()
+            return self.send_json_response({'success': True, 'cpu': PROFILER.status()})
+        if sub != 'memory':
+            return self.send_error(404, 'Endpoint not found')
+        action = payload.get('action')
+        try:
+            if action == 'start':
+                ALLOCATIONS.start(max(1, int(payload.get('frames') or 1)))
+            elif action == 'snapshot':
+                ALLOCATIONS.snapshot()
+            elif action == 'stop':
+                ALLOCATIONS.stop()
+            else:
+                return self.send_error(400, 'action must be start, snapshot or stop')
+        except (RuntimeError, ValueError, TypeError) as e:
+            return self.send_error(409 if isinstance(e, RuntimeError) else 400, str(e))
+        self.send_json_response({'success': True, 'memory': ALLOCATIONS.status()})
+
     # ── POST routes ───────────────────────────────────────
 
     def do_POST(self):
         parsed = urlparse(self.path)
         path = parsed.path
+        if self.rate_limited(path):
+            return
+        if self.body_too_large(MAX_ADMIN_POST_BODY if route_class('POST', path) == 'admin'
+                               else MAX_POST_BODY):
+            return
 
         if path == '/api/update':
             if not self.check_admin_auth():
@@ -142,44 +3647,70 @@ class MasterHandler(http.server.SimpleHTTPRequestHandler):
             if not self.check_admin_auth():
                 return self.require_auth()
             return self.update_team_stats()
+        elif path == '/api/update-batch':
+            if not self.check_admin_auth():
+                return self.require_auth()
+            return self.update_batch()
+        elif path == '/api/matches':
+            if not self.check_admin_auth():
+                return self.require_auth()
+            return self.append_matches()
+        elif path == '/api/ask/batch':
+            return self.ask_batch()
+        elif path == '/api/profile' or path.startswith('/api/profile/'):
+            if not self.check_admin_auth():
+                return self.require_auth()
+            return self.control_profile(path[len('/api/profile'):].strip('/'))
         else:
             self.send_error(404, 'Endpoint not found')
 
+    def body_too_large(self, limit):
+        """Send 413 and return True if the declared body is over `limit` bytes.
+        The body is never read, so the connection is closed."""
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.send_error(400, 'Invalid Content-Length')
+            return True
+        if length <= limit:
+            return False
+        self.send_error(413, f'Request body too large (max {limit} bytes)')
+        return True
+
     def read_post_body(self):
         """Read and parse JSON POST body."""
-        content_length = int(self.headers.get('Content-Length', 0))
-        post_data = self.rfile.read(content_length)
-        return json.loads(post_data.decode('utf-8'))
+        with timed('body'):
+            content_length = int(self.headers.get('Content-Length', 0))
+            post_data = self.rfile.read(content_length)
+            return json.loads(post_data.decode('utf-8'))
 
-    def update_stats(self):
-        """Update career totals only."""
+    def ask_batch(self):
+        """Answer a batch of questions: {"questions": [...]} or a bare list."""
         try:
-            new_stats = self.read_post_body()
-
-            required = ['matches', 'goals', 'assists', 'titles']
-            for field in required:
-                if field not in new_stats:
-                    self.send_error(400, f'Missing field: {field}')
-                    return
-
-            with open(STATS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            data['career_totals']['matches'] = int(new_stats['matches'])
-            data['career_totals']['goals'] = int(new_stats['goals'])
-            data['career_totals']['assists'] = int(new_stats['assists'])
-            data['career_totals']['titles'] = int(new_stats['titles'])
-            data['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-            with open(STATS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-
-            self.send_json_response({'success': True, 'message': 'Estadísticas actualizadas'})
-            print(f'✅ Stats updated: {data["career_totals"]}')
-
+            payload = self.read_post_body()
+            questions = payload.get('questions') if isinstance(payload, dict) else payload
+            if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+                self.send_error(400, 'Expected a list of questions')
+                return
+            if len(questions) > ASK_BATCH_MAX:
+                self.send_error(413, f'Too many questions (max {ASK_BATCH_MAX})')
+                return
+            snap = STORE.get()
+            with timed('compute'):
+                answers, stats = ask_batch(snap, questions)
+            self.send_json_response({'answers': answers, **stats})
+        except ValueError as e:
+            self.send_error(400, f'Invalid JSON: {e}')
         except Exception as e:
             self.send_error(500, str(e))
-            print(f'❌ Error: {e}')
+
+    def update_stats(self):
+        """Retired: career totals are derived from the teams, so this endpoint
+        could only rewrite the values already there. Edit the teams instead."""
+        self.send_error(410, 'career_totals are derived from the teams; '
+                             'use /api/update-team or /api/update-batch')
 
     def update_stats_full(self):
         """Full update — replace entire data structure."""
@@ -189,12 +3720,13 @@ class MasterHandler(http.server.SimpleHTTPRequestHandler):
             # Preserve metadata
             new_data['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-            with open(STATS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(new_data, f, indent=2, ensure_ascii=False)
+            STORE.replace(new_data)
 
             self.send_json_response({'success': True, 'message': 'Datos completos actualizados'})
             print(f'✅ Full data update completed')
 
+        except DerivedFieldError as e:
+            self.send_error(409, str(e))
         except Exception as e:
             self.send_error(500, str(e))
             print(f'❌ Error: {e}')
@@ -206,9 +3738,8 @@ class MasterHandler(http.server.SimpleHTTPRequestHandler):
 
             # Validate team name
             team = update_data.get('team')
-            valid_teams = ['barcelona', 'psg', 'inter_miami', 'argentina']
-            if team not in valid_teams:
-                self.send_error(400, f'Invalid team. Must be one of: {valid_teams}')
+            if team not in VALID_TEAMS:
+                self.send_error(400, f'Invalid team. Must be one of: {VALID_TEAMS}')
                 return
 
             # Validate required fields
@@ -218,33 +3749,17 @@ class MasterHandler(http.server.SimpleHTTPRequestHandler):
                     self.send_error(400, f'Missing field: {field}')
                     return
 
-            # Load current data
-            with open(STATS_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # Update team stats
-            data['teams'][team]['matches'] = int(update_data['matches'])
-            data['teams'][team]['goals'] = int(update_data['goals'])
-            data['teams'][team]['assists'] = int(update_data['assists'])
-            data['teams'][team]['titles'] = int(update_data['titles'])
-
-            # Recalculate career totals from all teams
-            totals = {'matches': 0, 'goals': 0, 'assists': 0, 'titles': 0}
-            for team_key in valid_teams:
-                if team_key in data['teams']:
-                    team_data = data['teams'][team_key]
-                    totals['matches'] += team_data.get('matches', 0)
-                    totals['goals'] += team_data.get('goals', 0)
-                    totals['assists'] += team_data.get('assists', 0)
-                    totals['titles'] += team_data.get('titles', 0)
-
-            # Update career totals
-            data['career_totals'] = totals
-            data['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-            # Save
-            with open(STATS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            def apply(data):
+                # Update team stats
+                data['teams'][team]['matches'] = int(update_data['matches'])
+                data['teams'][team]['goals'] = int(update_data['goals'])
+                data['teams'][team]['assists'] = int(update_data['assists'])
+                data['teams'][team]['titles'] = int(update_data['titles'])
+                # career_totals and titles_detail follow via the derived views
+                data['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+            # Read-modify-write under the store's writer lock
+            data = STORE.update(apply).data
 
             self.send_json_response({
                 'success': True,
@@ -258,18 +3773,558 @@ class MasterHandler(http.server.SimpleHTTPRequestHandler):
             self.send_error(500, str(e))
             print(f'❌ Error: {e}')
 
-    def send_json_response(self, data, status=200):
+    def update_batch(self):
+        """Apply several team changes as one atomic write.
+
+        Body: {"updates": [{"team": "inter_miami", "goals": 80, ...},
+                           {"team": "argentina", "goals": 116}]}
+        Team fields may be partial. Career totals are derived from the teams
+        once, after the whole batch; a {"career_totals": ...} item is refused
+        with 400.
+        """
+        try:
+            updates = self.read_post_body().get('updates')
+            if not isinstance(updates, list) or not updates:
+                self.send_error(400, 'Expected a non-empty "updates" list')
+                return
+
+            team_changes = []
+            for item in updates:
+                if 'team' in item:
+                    team = item['team']
+                    if team not in VALID_TEAMS:
+                        self.send_error(400, f'Invalid team. Must be one of: {VALID_TEAMS}')
+                        return
+                    fields = {f: int(item[f]) for f in STAT_FIELDS if f in item}
+                    if not fields:
+                        self.send_error(400, f'No fields to update for team {team}')
+                        return
+                    team_changes.append((team, fields))
+                elif 'career_totals' in item:
+                    self.send_error(400, 'career_totals cannot be updated; they are derived '
+                                         'from the teams, update the teams instead')
+                    return
+                else:
+                    self.send_error(400, f'Invalid update: {item}')
+                    return
+
+            def apply(data):
+                for team, fields in team_changes:
+                    data['teams'][team].update(fields)
+                # Derived totals are refreshed once, after the whole mutation
+                data['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+            data = STORE.update(apply).data
+            changed_teams = sorted({team for team, _ in team_changes})
+            self.send_json_response({
+                'success': True,
+                'message': f'{len(updates)} cambios aplicados',
+                'teams': {team: data['teams'][team] for team in changed_teams},
+                'career_totals': data['career_totals']
+            })
+            print(f'✅ Batch update: {len(updates)} changes ({", ".join(changed_teams)})')
+
+        except (ValueError, TypeError, AttributeError) as e:
+            self.send_error(400, f'Invalid update: {e}')
+        except Exception as e:
+            self.send_error(500, str(e))
+            print(f'❌ Error: {e}')
+
+    def append_matches(self):
+        """Append matches to the match log and fold them into the stats.
+
+        Body: one match {"date": "2025-10-18", "team": "inter_miami",
+        "competition": "mls", "goals": 2, "assists": 1, "minutes": 90}
+        or {"matches": [...]}.
+        """
+        try:
+            body = self.read_post_body()
+            items = body.get('matches', [body]) if isinstance(body, dict) else body
+            if not isinstance(items, list) or not items:
+                self.send_error(400, 'Expected a match or a non-empty "matches" list')
+                return
+            matches = [parse_match(item) for item in items]
+        except (ValueError, TypeError, AttributeError) as e:
+            self.send_error(400, f'Invalid match: {e}')
+            return
+        try:
+            MATCH_LOG.append(matches)
+
+            def apply(data):
+                # Folds everything up to the end of the log, so a write that
+                # was group-committed with another one may find nothing left
+                MATCH_LOG.fold_pending(data)
+                data['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+            data = STORE.update(apply).data
+            teams = sorted({match['team'] for match in matches})
+            self.send_json_response({
+                'success': True,
+                'message': f'{len(matches)} partidos registrados',
+                'match_log': data['match_log'],
+                'teams': {team: data['teams'][team] for team in teams},
+                'career_totals': data['career_totals']
+            })
+            print(f'✅ {len(matches)} matches appended ({", ".join(teams)})')
+
+        except Exception as e:
+            self.send_error(500, str(e))
+            print(f'❌ Error: {e}')
+
+    def send_body(self, body, ctype, headers=None):
+        """Send a 200 with `body` (bytes) as `ctype`, not cached."""
+        self.send_response(200)
+        self.send_header('Content-type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json_response(self, data, status=200, headers=None):
         """Helper to send JSON response."""
+        with timed('serialize'):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
         self.send_response(status)
         self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.send_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        self.wfile.write(body)
+
+
+# ── Server engines ────────────────────────────────────────
 
+class DetachMixin:
+    """Lets a handler take over its socket (e.g. for SSE) so the server
+    does not close it when the handler returns."""
 
-def run():
+    def __init__(self, *args, **kwargs):
+        self.detached_requests = set()
+        super().__init__(*args, **kwargs)
+
+    def detach(self, request):
+        self.detached_requests.add(request)
+        return True
+
+    def reattach(self, request):
+        """Undo detach(): the server closes `request` as usual."""
+        self.detached_requests.discard(request)
+
+    def shutdown_request(self, request):
+        try:
+            self.detached_requests.remove(request)
+        except KeyError:
+            super().shutdown_request(request)
+
+
+class SingleHTTPServer(DetachMixin, http.server.HTTPServer):
+    """The original single-threaded server."""
+
+    request_queue_size = socket.SOMAXCONN
+
+
+class PooledHTTPServer(DetachMixin, http.server.HTTPServer):
+    """HTTPServer that hands each connection to a bounded thread pool.
+
+    At most `max_inflight` connections are accepted at once; beyond that the
+    accept loop waits and new clients queue in the listen backlog. Once
+    `max_queue` accepted connections are already waiting for a worker, new
+    ones are shed with an immediate 503 so queueing latency stays bounded.
+    """
+
+    # socketserver's default backlog of 5 drops SYNs during connection bursts
+    # (e.g. SSE clients reconnecting), costing each dropped client a 1s retry
+    request_queue_size = socket.SOMAXCONN
+
+    def __init__(self, server_address, handler_class, workers=SERVER_WORKERS,
+                 max_inflight=SERVER_MAX_INFLIGHT, max_queue=SERVER_MAX_QUEUE):
+        super().__init__(server_address, handler_class)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='messi-http')
+        self.inflight = threading.BoundedSemaphore(max(max_inflight, workers))
+        self.workers = workers
+        self.max_queue = max_queue
+        # Workers decrement `active` from their own threads
+        self._counters = threading.Lock()
+        self.active = 0
+        self.shed = 0
+
+    def saturated(self):
+        """True when every worker is busy; handlers then stop keeping
+        connections alive so idle clients cannot starve new ones."""
+        return self.active >= self.workers
+
+    def process_request(self, request, client_address):
+        if self.max_queue and self.active - self.workers >= self.max_queue:
+            return self.shed_request(request)
+        self.inflight.acquire()
+        with self._counters:
+            self.active += 1
+        try:
+            self.pool.submit(self._process, request, client_address)
+        except RuntimeError:
+            # Pool already shut down
+            with self._counters:
+                self.active -= 1
+            self.inflight.release()
+            self.shutdown_request(request)
+
+    def shed_request(self, request):
+        """Answer 503 right away instead of queueing behind busy workers."""
+        with self._counters:
+            self.shed += 1
+        try:
+            request.setblocking(False)
+            try:
+                # Drain what already arrived so closing does not reset the
+                # connection before the client reads the response
+                request.recv(65536)
+            except OSError:
+                pass
+            request.sendall(overloaded_response())
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._counters:
+                self.active -= 1
+            self.inflight.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+class BufferedHandler(MasterHandler):
+    """MasterHandler running over in-memory buffers instead of a socket.
+
+    Used by the async engine: the event loop reads the full request, a pool
+    thread runs the handler, and the event loop writes the response back.
+    """
+
+    use_sendfile = False
+
+    def setup(self):
+        raw, self.requests_served = self.request
+        self.rfile = io.BytesIO(raw)
+        self.wfile = io.BytesIO()
+
+    def handle(self):
+        # The event loop owns the connection; run exactly one request
+        self.close_connection = True
+        self.handle_one_request()
+
+    def handle_expect_100(self):
+        # The event loop already answered "100 Continue" before reading the body
+        return True
+
+    stream = None
+
+    def start_stream(self, last_event_id):
+        # The event loop subscribes the connection after sending the headers
+        self.stream = (last_event_id,)
+
+    def finish(self):
+        pass
+
+
+class AsyncHTTPServer:
+    """asyncio engine: socket I/O on the event loop, handlers on a thread pool.
+
+    Slow or idle clients only cost a coroutine, so a phone downloading a large
+    image never ties up a worker thread.
+    """
+
+    MAX_HEADER_BYTES = 64 * 1024
+
+    def __init__(self, server_address, handler_class, workers=SERVER_WORKERS,
+                 max_inflight=SERVER_MAX_INFLIGHT, timeout=SERVER_TIMEOUT,
+                 idle_timeout=KEEP_ALIVE_IDLE_TIMEOUT, reuse_port=False,
+                 max_queue=SERVER_MAX_QUEUE):
+        self.server_address = server_address
+        self.handler_class = handler_class
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.reuse_port = reuse_port
+        self.max_queue = max_queue
+        # Only the event loop thread touches these, so no lock
+        self.waiting = 0
+        self.shed = 0
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='messi-async')
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def server_close(self):
+        self.pool.shutdown(wait=False)
+
+    async def _serve(self):
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        host, port = self.server_address
+        server = await asyncio.start_server(self._handle, host or None, port,
+                                            limit=self.MAX_HEADER_BYTES,
+                                            backlog=socket.SOMAXCONN,
+                                            reuse_port=self.reuse_port or None)
+        async with server:
+            await server.serve_forever()
+
+    async def _read_request(self, reader, writer, idle_timeout):
+        # Waiting for the first byte of a request counts as idle time
+        first = await asyncio.wait_for(reader.read(1), idle_timeout)
+        if not first:
+            return None
+        head = first + await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.timeout)
+        length = 0
+        expect_continue = False
+        for line in head.split(b'\r\n')[1:]:
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            if name == b'content-length':
+                length = int(value.strip() or 0)
+            elif name == b'expect' and value.strip().lower() == b'100-continue':
+                expect_continue = True
+        if length > max(MAX_POST_BODY, MAX_ADMIN_POST_BODY):
+            # Leave it unread: the handler answers 413 and closes
+            length = 0
+        if length > 0 and expect_continue and head.split(b'\r\n', 1)[0].endswith(b'HTTP/1.1'):
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        body = b''
+        if length > 0:
+            body = await asyncio.wait_for(reader.readexactly(length), self.timeout)
+        return head + body
+
+    def _dispatch(self, raw, requests_served, client_address):
+        handler = self.handler_class((raw, requests_served), client_address, self)
+        return handler.wfile.getvalue(), handler.close_connection, handler.stream
+
+    async def _stream(self, reader, writer, last_event_id):
+        sub = STREAM_HUB.subscribe_async(asyncio.get_running_loop(), writer, last_event_id)
+        if sub is None:
+            return
+        try:
+            # Subscribers never send anything; EOF means they went away
+            while await reader.read(4096):
+                pass
+        finally:
+            STREAM_HUB.unsubscribe(sub)
+
+    async def _handle(self, reader, writer):
+        client_address = (writer.get_extra_info('peername') or ('', 0))[:2]
+        loop = asyncio.get_running_loop()
+        served = 0
+        try:
+            while True:
+                raw = await self._read_request(reader, writer,
+                                               self.timeout if served == 0 else self.idle_timeout)
+                if raw is None:
+                    break
+                if self._slots.locked() and self.waiting >= self.max_queue > 0:
+                    # Shed load instead of queueing behind busy handlers
+                    self.shed += 1
+                    writer.write(overloaded_response())
+                    break
+                self.waiting += 1
+                try:
+                    await self._slots.acquire()
+                finally:
+                    self.waiting -= 1
+                try:
+                    response, close, stream = await loop.run_in_executor(
+                        self.pool, self._dispatch, raw, served, client_address)
+                finally:
+                    self._slots.release()
+                writer.write(response)
+                await asyncio.wait_for(writer.drain(), self.timeout)
+                if stream is not None:
+                    await self._stream(reader, writer, *stream)
+                    break
+                served += 1
+                if close:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+class Supervisor:
+    """Pre-forked worker processes sharing one port.
+
+    Every worker builds its own server bound with SO_REUSEPORT, so the
+    kernel spreads incoming connections across processes and handlers run
+    on every core. Workers that exit are restarted; one that dies right
+    after starting (e.g. the port is taken) is restarted with a growing
+    delay. SIGTERM / SIGINT stop all workers.
+
+    Workers share nothing in memory: each StatsStore notices writes made by
+    the others through the backend's change token on the next request, and
+    their SSE hubs poll it every second.
+    """
+
+    MIN_UPTIME = 1.0
+    MAX_RESTART_DELAY = 30.0
+
+    def __init__(self, processes, start_worker):
+        self.processes = processes
+        self.start_worker = start_worker
+        self.workers = {}
+        self.stopping = False
+        self._delays = {}
+
+    def _spawn(self, slot):
+        # Anything still buffered would otherwise be printed by every child
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            code = 1
+            try:
+                self.start_worker(slot)
+                code = 0
+            except KeyboardInterrupt:
+                code = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        self.workers[pid] = (slot, time.monotonic())
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve_forever(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.processes):
+            self._spawn(slot)
+        while self.workers:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            slot, started = self.workers.pop(pid, (None, 0))
+            if slot is None or self.stopping:
+                continue
+            delay = 0
+            if time.monotonic() - started < self.MIN_UPTIME:
+                delay = self._delays[slot] = min(self._delays.get(slot, 0.5) * 2,
+                                                 self.MAX_RESTART_DELAY)
+            else:
+                self._delays.pop(slot, None)
+            print(f'⚠️  Worker {slot} (pid {pid}) exited with status '
+                  f'{os.waitstatus_to_exitcode(status)}; restarting'
+                  + (f' in {delay:g}s' if delay else ''))
+            if delay:
+                time.sleep(delay)
+            if not self.stopping:
+                self._spawn(slot)
+
+
+def build_server(mode, port, workers, max_inflight, timeout, keep_alive=KEEP_ALIVE,
+                 idle_timeout=KEEP_ALIVE_IDLE_TIMEOUT, max_requests=KEEP_ALIVE_MAX_REQUESTS,
+                 reuse_port=False, max_queue=SERVER_MAX_QUEUE):
+    """Create the server engine for `mode` ('pool', 'async' or 'single').
+    With `reuse_port`, several processes can bind the same port."""
+    MasterHandler.timeout = timeout
+    # A single-threaded server cannot afford to wait on idle connections
+    keep_alive = keep_alive and mode != 'single'
+    MasterHandler.protocol_version = 'HTTP/1.1' if keep_alive else 'HTTP/1.0'
+    MasterHandler.idle_timeout = idle_timeout
+    MasterHandler.max_requests = max_requests
+    if mode == 'async':
+        return AsyncHTTPServer(('', port), BufferedHandler, workers, max_inflight, timeout,
+                               idle_timeout, reuse_port, max_queue)
+    if mode == 'pool':
+        PooledHTTPServer.allow_reuse_port = reuse_port
+        return PooledHTTPServer(('', port), MasterHandler, workers, max_inflight, max_queue)
+    if mode == 'single':
+        SingleHTTPServer.allow_reuse_port = reuse_port
+        return SingleHTTPServer(('', port), MasterHandler)
+    raise ValueError(f'Unknown server mode: {mode}')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Messi Stats unified server')
+    parser.add_argument('port', nargs='?', type=int, default=PORT)
+    parser.add_argument('--mode', choices=['pool', 'async', 'single'], default=SERVER_MODE)
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS,
+                        help='worker threads handling requests (per process)')
+    parser.add_argument('--processes', type=int, default=SERVER_PROCESSES,
+                        help='pre-forked server processes sharing the port (SO_REUSEPORT)')
+    parser.add_argument('--max-inflight', type=int, default=SERVER_MAX_INFLIGHT,
+                        help='max requests processed at once')
+    parser.add_argument('--timeout', type=float, default=SERVER_TIMEOUT,
+                        help='per-connection socket timeout in seconds')
+    parser.add_argument('--max-queue', type=int, default=SERVER_MAX_QUEUE,
+                        help='requests waiting for a worker before new ones get 503 (0 = never)')
+    parser.add_argument('--no-keep-alive', dest='keep_alive', action='store_false',
+                        default=KEEP_ALIVE, help='disable HTTP/1.1 persistent connections')
+    parser.add_argument('--idle-timeout', type=float, default=KEEP_ALIVE_IDLE_TIMEOUT,
+                        help='seconds an idle keep-alive connection is held open')
+    parser.add_argument('--max-requests', type=int, default=KEEP_ALIVE_MAX_REQUESTS,
+                        help='max requests served per keep-alive connection')
+    parser.add_argument('--server-timing', action='store_true', default=SERVER_TIMING,
+                        help='add a Server-Timing header with per-phase durations')
+    parser.add_argument('--timing-log', action='store_true', default=SERVER_TIMING_LOG,
+                        help='log one JSON line per request with its phase durations')
+    parser.add_argument('--precompress', action='store_true',
+                        help='build gzip/brotli variants of static files and exit')
+    parser.add_argument('--migrate-sqlite', metavar='DB', nargs='?', const=STATS_DB,
+                        help='import the JSON stats and match log into a new SQLite DB and exit')
+    parser.add_argument('--export-json', metavar='DB', nargs='?', const=STATS_DB,
+                        help='write an SQLite DB back out as JSON stats + match log and exit')
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    global PORT, SHARED_SNAPSHOT, SERVER_TIMING, SERVER_TIMING_LOG
+    args = parse_args(argv)
+    PORT = args.port
+    SERVER_TIMING, SERVER_TIMING_LOG = args.server_timing, args.timing_log
     os.chdir(os.path.dirname(os.path.abspath(__file__)) or '.')
-    server = http.server.HTTPServer(('', PORT), MasterHandler)
+    if args.precompress:
+        count = STATIC_VARIANTS.precompress('.')
+        print(f'✅ {count} compressed variants in {STATIC_CACHE_DIR}/')
+        return
+    if args.migrate_sqlite:
+        count = migrate_to_sqlite(args.migrate_sqlite)
+        print(f'✅ {STATS_FILE} + {count} matches imported into {args.migrate_sqlite}')
+        print(f'   Start with: STATS_BACKEND=sqlite STATS_DB={args.migrate_sqlite} python3 server.py')
+        return
+    if args.export_json:
+        count = export_json(args.export_json)
+        print(f'✅ {args.export_json} exported to {STATS_FILE} + {count} matches in {MATCHES_FILE}')
+        return
+    pending = sync_match_log()
+    if pending:
+        print(f'✅ {pending} matches folded from {MATCHES_FILE}')
+    processes = args.processes if args.processes > 1 else 1
+    if processes > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        raise SystemExit('--processes needs fork() and SO_REUSEPORT')
+    keep_alive = (f'on ({args.idle_timeout:g}s idle, {args.max_requests} requests/conn)'
+                  if args.keep_alive and args.mode != 'single' else 'off')
     print(f'''
 ╔══════════════════════════════════════════╗
 ║   ⚽ Messi Stats Server                  ║
@@ -277,12 +4332,32 @@ def run():
 ║   Admin: http://localhost:{PORT}/admin      ║
 ║   API:   http://localhost:{PORT}/api/stats  ║
 ╚══════════════════════════════════════════╝
+   Mode: {args.mode} ({args.workers} workers, {args.max_inflight} in-flight, {args.timeout:g}s timeout)
+   Processes: {processes}
+   Keep-alive: {keep_alive}
     ''')
+
+    def serve(slot=None):
+        server = build_server(args.mode, PORT, args.workers, args.max_inflight, args.timeout,
+                              args.keep_alive, args.idle_timeout, args.max_requests,
+                              reuse_port=slot is not None, max_queue=args.max_queue)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
     try:
-        server.serve_forever()
+        if processes > 1:
+            SHARED_SNAPSHOT = SharedSnapshot.create()
+            try:
+                Supervisor(processes, serve).serve_forever()
+            finally:
+                SHARED_SNAPSHOT.remove()
+        else:
+            serve()
     except KeyboardInterrupt:
-        print('\n🛑 Server stopped.')
-        server.server_close()
+        pass
+    print('\n🛑 Server stopped.')
 
 
 if __name__ == '__main__':
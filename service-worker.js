@@ -68,6 +68,15 @@ self.addEventListener('fetch', event => {
     return;
   }
 
+  // Las APIs van directo a la red, salvo /api/stats (se guarda para modo
+  // offline). El stream SSE de /api/stats/stream nunca termina: guardarlo
+  // dejaría la conexión abierta aunque se cierre la página.
+  const url = new URL(event.request.url);
+  if (url.origin === self.location.origin && url.pathname.startsWith('/api/') &&
+      url.pathname !== '/api/stats') {
+    return;
+  }
+
   event.respondWith(
     fetch(event.request)
       .then(response => {
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# server.py opens js/messi-stats.json and friends relative to the site root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
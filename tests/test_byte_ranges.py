@@ -0,0 +1,71 @@
+import pytest
+
+import server
+from server import parse_byte_ranges
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-0', [(0, 0)]),
+    ('bytes=100-299', [(100, 299)]),
+    ('bytes=500-', [(500, 999)]),
+    ('bytes=0-5000', [(0, 999)]),
+    ('BYTES = 1 - 2', [(1, 2)]),
+])
+def test_single_range(header, expected):
+    assert parse_byte_ranges(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=-50', [(950, 999)]),
+    ('bytes=-1', [(999, 999)]),
+    # Longer than the file: the whole file
+    ('bytes=-2000', [(0, 999)]),
+])
+def test_suffix_range(header, expected):
+    assert parse_byte_ranges(header, 1000) == expected
+
+
+def test_multiple_ranges_are_sorted():
+    assert parse_byte_ranges('bytes=500-509,0-9', 1000) == [(0, 9), (500, 509)]
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-3,2-8', [(0, 8)]),
+    # Adjacent ranges are merged too
+    ('bytes=0-3,4-8,9-9', [(0, 9)]),
+    ('bytes=10-19,0-4,3-7,500-509', [(0, 7), (10, 19), (500, 509)]),
+    ('bytes=-100,950-', [(900, 999)]),
+])
+def test_overlapping_ranges_are_merged(header, expected):
+    assert parse_byte_ranges(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header, size', [
+    ('bytes=1000-', 1000),
+    ('bytes=1000-2000', 1000),
+    ('bytes=-0', 1000),
+    ('bytes=0-', 0),
+    ('bytes=-5', 0),
+])
+def test_unsatisfiable(header, size):
+    assert parse_byte_ranges(header, size) == []
+
+
+def test_unsatisfiable_ranges_are_dropped_from_a_set():
+    assert parse_byte_ranges('bytes=2000-2999,0-9', 1000) == [(0, 9)]
+
+
+@pytest.mark.parametrize('header', [
+    'items=0-1',
+    'bytes=',
+    'bytes=abc',
+    'bytes=10-5',
+    'bytes=0-1,,3',
+    'bytes=5',
+    'bytes=-',
+    'bytes=-1-2',
+    'bytes=+1-2',
+    'bytes=' + ','.join(['0-1'] * (server.MAX_BYTE_RANGES + 1)),
+])
+def test_malformed_is_ignored(header):
+    assert parse_byte_ranges(header, 1000) is None
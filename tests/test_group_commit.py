@@ -0,0 +1,145 @@
+import base64
+import http.client
+import http.server
+import json
+import shutil
+import threading
+
+import pytest
+
+import server
+
+AUTH = 'Basic ' + base64.b64encode(f'{server.ADMIN_USER}:{server.ADMIN_PASS}'.encode()).decode()
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / 'messi-stats.json')
+    shutil.copy(server.STATS_FILE, path)
+    store = server.StatsStore(server.JSONFileBackend(path), group_window=0.2)
+    store.saves = 0
+    save = store.backend.save
+
+    def counting_save(data, body):
+        store.saves += 1
+        return save(data, body)
+
+    store.backend.save = counting_save
+    store.get()
+    return store
+
+
+@pytest.fixture
+def post(store, monkeypatch):
+    """POST to a real MasterHandler whose STORE is `store`."""
+    monkeypatch.setattr(server, 'STORE', store)
+    monkeypatch.setattr(server, 'RATE_LIMITER', server.TokenBucketLimiter({}, 10))
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), server.MasterHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    def post(path, body):
+        conn = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=10)
+        try:
+            conn.request('POST', path, json.dumps(body),
+                         {'Authorization': AUTH, 'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            return response.status, response.read()
+        finally:
+            conn.close()
+
+    yield post
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def run_together(*calls):
+    """Start every call at the same time; their results, in order."""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def run(i, call):
+        barrier.wait()
+        results[i] = call()
+
+    threads = [threading.Thread(target=run, args=(i, call)) for i, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def on_disk(store):
+    with open(store.backend.path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_concurrent_batch_and_team_writes_share_one_commit(store, post):
+    psg = dict(store.get().data['teams']['psg'], team='psg', goals=40)
+    results = run_together(
+        lambda: post('/api/update-batch', {'updates': [{'team': 'inter_miami', 'goals': 80},
+                                                       {'team': 'argentina', 'goals': 116}]}),
+        lambda: post('/api/update-team', psg),
+    )
+    assert [status for status, _ in results] == [200, 200]
+    assert store.saves == 1
+    assert (store.commits, store.committed_writes) == (1, 2)
+    data = on_disk(store)
+    teams = data['teams']
+    assert (teams['inter_miami']['goals'], teams['argentina']['goals'], teams['psg']['goals']) \
+        == (80, 116, 40)
+    assert data['career_totals']['goals'] == sum(team['goals'] for team in teams.values())
+
+
+def test_writers_in_one_window_get_the_same_snapshot(store):
+    def set_goals(goals):
+        def mutate(data):
+            data['teams']['psg']['goals'] = goals
+        return lambda: store.update(mutate)
+
+    snaps = run_together(set_goals(40), set_goals(41), set_goals(42))
+    assert store.saves == 1
+    assert snaps[0] is snaps[1] is snaps[2]
+    assert snaps[0].data == on_disk(store)
+
+
+def test_a_failed_mutation_rolls_back_its_whole_batch(store):
+    before = store.get().data
+
+    def failing_batch(data):
+        data['teams']['psg']['goals'] = 40
+        data['teams']['argentina']['goals'] = 116
+        raise ValueError('boom')
+
+    def good_write(data):
+        data['teams']['inter_miami']['goals'] = 80
+
+    results = run_together(lambda: pytest.raises(ValueError, store.update, failing_batch),
+                           lambda: store.update(good_write))
+    assert results[0].match('boom')
+    assert store.saves == 1
+    teams = on_disk(store)['teams']
+    assert teams['inter_miami']['goals'] == 80
+    assert teams['psg'] == before['teams']['psg']
+    assert teams['argentina'] == before['teams']['argentina']
+
+
+def test_a_batch_refused_by_the_derived_fields_leaves_no_trace(store):
+    before = on_disk(store)
+
+    def contradicting_batch(data):
+        data['teams']['psg']['goals'] = 40
+        data['career_totals']['goals'] = 1
+
+    with pytest.raises(server.DerivedFieldError):
+        store.update(contradicting_batch)
+    assert store.saves == 0
+    assert on_disk(store) == before
+
+
+def test_update_batch_rejects_career_totals_items(store, post):
+    status, _ = post('/api/update-batch', {'updates': [{'team': 'psg', 'goals': 40},
+                                                       {'career_totals': {'goals': 1}}]})
+    assert status == 400
+    assert store.saves == 0
@@ -0,0 +1,108 @@
+import copy
+
+import pytest
+
+import server
+
+OPENING = {
+    'teams': {
+        'inter_miami': {'matches': 80, 'goals': 70, 'assists': 30,
+                        'goals_by_year': {'2024': 20}},
+        'argentina': {'matches': 190, 'goals': 112, 'assists': 58},
+    },
+}
+
+
+def match(team='inter_miami', day='2025-10-18', competition='mls', goals=2, assists=1,
+          minutes=90):
+    return server.parse_match({'date': day, 'team': team, 'competition': competition,
+                               'goals': goals, 'assists': assists, 'minutes': minutes})
+
+
+@pytest.fixture
+def log(tmp_path):
+    return server.MatchLog(str(tmp_path / 'matches.jsonl'))
+
+
+def test_fold_adds_to_opening_balances():
+    data = copy.deepcopy(OPENING)
+    server.fold_match(data, match(goals=2, assists=1))
+    team = data['teams']['inter_miami']
+    assert (team['matches'], team['goals'], team['assists']) == (81, 72, 31)
+    assert team['goals_by_year'] == {'2024': 20, '2025': 2}
+    assert team['competitions'] == {'mls': {'matches': 1, 'goals': 2, 'assists': 1,
+                                            'minutes': 90}}
+    assert data['teams']['argentina'] == OPENING['teams']['argentina']
+
+
+def test_replay_folds_every_entry_once(log):
+    log.append([match(goals=1), match(team='argentina', competition='amistoso', goals=3)])
+    data = copy.deepcopy(OPENING)
+    assert log.fold_pending(data) == 2
+    assert data['match_log'] == {'offset': log.size(), 'matches': 2}
+    assert data['teams']['inter_miami']['goals'] == 71
+    assert data['teams']['argentina']['goals'] == 115
+    # Nothing new: a second replay changes nothing
+    before = copy.deepcopy(data)
+    assert log.fold_pending(data) == 0
+    assert data == before
+
+
+def test_replay_reads_only_new_entries(log):
+    data = copy.deepcopy(OPENING)
+    log.append([match(goals=1)])
+    log.fold_pending(data)
+    log.append([match(day='2025-10-25', goals=2), match(day='2025-11-01', goals=0)])
+    assert log.fold_pending(data) == 2
+    team = data['teams']['inter_miami']
+    assert (team['matches'], team['goals']) == (83, 73)
+    assert data['match_log']['matches'] == 3
+
+
+def test_incremental_replay_matches_full_replay(log):
+    log.append([match(goals=1), match(team='argentina', competition='amistoso')])
+    log.append([match(day='2025-10-25', competition='leagues_cup', goals=3)])
+    incremental = copy.deepcopy(OPENING)
+    log.fold_pending(incremental)
+    log.append([match(day='2025-11-01', goals=2)])
+    log.fold_pending(incremental)
+    full = copy.deepcopy(OPENING)
+    log.fold_pending(full)
+    assert incremental == full
+
+
+def test_partial_line_waits_for_the_rest(log):
+    log.append([match(goals=1)])
+    with open(log.path, 'ab') as f:
+        f.write(b'{"date": "2025-10-25", "team": "inter_miami"')
+    data = copy.deepcopy(OPENING)
+    assert log.fold_pending(data) == 1
+    offset = data['match_log']['offset']
+    assert offset < log.size()
+    with open(log.path, 'ab') as f:
+        f.write(b', "competition": "mls", "goals": 2, "assists": 0, "minutes": 90}\n')
+    assert log.fold_pending(data) == 1
+    assert data['teams']['inter_miami']['goals'] == 73
+
+
+def test_missing_log_is_empty(log):
+    data = copy.deepcopy(OPENING)
+    assert log.size() == 0
+    assert log.fold_pending(data) == 0
+    assert data['teams'] == OPENING['teams']
+
+
+@pytest.mark.parametrize('item', [
+    {'team': 'inter_miami'},
+    {'date': '2025-10-18', 'team': 'santos', 'competition': 'mls', 'goals': 1,
+     'assists': 0, 'minutes': 90},
+    {'date': '2025-10-18', 'team': 'inter_miami', 'competition': 'MLS!', 'goals': 1,
+     'assists': 0, 'minutes': 90},
+    {'date': '2025-10-18', 'team': 'inter_miami', 'competition': 'mls', 'goals': -1,
+     'assists': 0, 'minutes': 90},
+    {'date': 'yesterday', 'team': 'inter_miami', 'competition': 'mls', 'goals': 1,
+     'assists': 0, 'minutes': 90},
+])
+def test_parse_match_rejects_invalid(item):
+    with pytest.raises(ValueError):
+        server.parse_match(item)
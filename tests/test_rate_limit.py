@@ -0,0 +1,141 @@
+import http.client
+import http.server
+import socket
+import socketserver
+import threading
+
+import pytest
+
+import server
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def limiter(clock, limits=None, max_buckets=100):
+    return server.TokenBucketLimiter(limits or {'read': (2.0, 4), 'admin': (0.5, 1)},
+                                     max_buckets, clock)
+
+
+def test_burst_then_limited(clock):
+    buckets = limiter(clock)
+    assert [buckets.acquire('a', 'read') for _ in range(4)] == [0, 0, 0, 0]
+    assert buckets.acquire('a', 'read') == pytest.approx(0.5)
+    assert buckets.limited == 1
+
+
+def test_tokens_refill_at_the_rate_up_to_the_burst(clock):
+    buckets = limiter(clock)
+    for _ in range(4):
+        buckets.acquire('a', 'read')
+    clock.now += 1.0
+    assert [buckets.acquire('a', 'read') for _ in range(2)] == [0, 0]
+    assert buckets.acquire('a', 'read') > 0
+    # A long idle period refills to the burst, never beyond it
+    clock.now += 3600
+    assert [buckets.acquire('a', 'read') for _ in range(4)] == [0, 0, 0, 0]
+    assert buckets.acquire('a', 'read') > 0
+
+
+def test_wait_reflects_the_partial_token(clock):
+    buckets = limiter(clock)
+    assert buckets.acquire('a', 'admin') == 0
+    clock.now += 1.0
+    # Half a token back at 0.5/s: one more second to go
+    assert buckets.acquire('a', 'admin') == pytest.approx(1.0)
+
+
+def test_routes_and_clients_have_separate_buckets(clock):
+    buckets = limiter(clock)
+    assert buckets.acquire('a', 'admin') == 0
+    assert buckets.acquire('a', 'admin') > 0
+    assert buckets.acquire('a', 'read') == 0
+    assert buckets.acquire('b', 'admin') == 0
+
+
+def test_unlimited_routes_never_wait(clock):
+    buckets = limiter(clock, {'read': (0, 0)})
+    assert all(buckets.acquire('a', route) == 0 for route in ['read', 'admin'] * 100)
+    assert len(buckets) == 0
+
+
+def test_bucket_count_stays_bounded(clock):
+    buckets = limiter(clock, max_buckets=3)
+    for client in 'abcdef':
+        buckets.acquire(client, 'read')
+    assert len(buckets) == 3
+
+
+def test_route_class():
+    assert server.route_class('GET', '/index.html') is None
+    assert server.route_class('GET', '/api/stats') == 'read'
+    assert server.route_class('POST', '/api/ask/batch') == 'read'
+    assert server.route_class('POST', '/api/update-team') == 'admin'
+
+
+def test_429_carries_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(server, 'RATE_LIMITER', limiter(clock, {'read': (0.25, 1)}))
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), server.MasterHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        def get():
+            conn = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1], timeout=10)
+            try:
+                conn.request('GET', '/api/status')
+                response = conn.getresponse()
+                response.read()
+                return response.status, response.getheader('Retry-After')
+            finally:
+                conn.close()
+
+        assert get()[0] != 429
+        assert get() == (429, '4')
+        clock.now += 3.5
+        # 0.875 tokens: rounded up to whole seconds
+        assert get() == (429, '1')
+        clock.now += 0.5
+        assert get()[0] != 429
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+class BlockingHandler(socketserver.BaseRequestHandler):
+    release = threading.Event()
+
+    def handle(self):
+        self.release.wait(10)
+
+
+def test_connections_beyond_the_queue_are_shed_with_503():
+    httpd = server.PooledHTTPServer(('127.0.0.1', 0), BlockingHandler,
+                                    workers=1, max_inflight=4, max_queue=1)
+    pairs = [socket.socketpair() for _ in range(3)]
+    try:
+        for ours, _ in pairs:
+            httpd.process_request(ours, ('127.0.0.1', 0))
+        # One connection runs, one waits for the worker, the third is shed
+        assert (httpd.active, httpd.shed) == (2, 1)
+        client = pairs[2][1]
+        client.settimeout(5)
+        response = client.recv(65536)
+        assert response.startswith(b'HTTP/1.1 503 ')
+        assert b'\r\nRetry-After: 1\r\n' in response
+        assert httpd.saturated()
+    finally:
+        BlockingHandler.release.set()
+        httpd.pool.shutdown(wait=True)
+        httpd.server_close()
+        for ours, theirs in pairs:
+            theirs.close()
+    assert httpd.active == 0
@@ -0,0 +1,67 @@
+import struct
+
+import pytest
+
+import server
+
+
+def snapshot(goals, version=1):
+    return server.StatsSnapshot({'career_totals': {'goals': goals}}, version, token=version)
+
+
+@pytest.fixture
+def shared(tmp_path):
+    segment = server.SharedSnapshot(str(tmp_path / 'stats.snap'))
+    yield segment
+    segment.remove()
+
+
+def test_read_before_publish(shared):
+    assert shared.read() is None
+
+
+def test_publish_then_read(shared, tmp_path):
+    snap = snapshot(800)
+    shared.publish(snap)
+    # A second process maps the same file
+    entry = server.SharedSnapshot(shared.path).read()
+    assert entry.seq % 2 == 0
+    assert entry.token == repr(snap.token)
+    assert entry.etag == snap.etag
+    assert entry.bodies[None] == snap.body
+    assert entry.bodies['gzip'] == snap.encoded('gzip')
+
+
+def test_publish_same_token_is_a_noop(shared):
+    first = shared.publish(snapshot(800))
+    assert shared.publish(snapshot(800)).seq == first.seq
+
+
+def test_newer_version_replaces_older(shared):
+    shared.publish(snapshot(800, version=1))
+    newer = snapshot(900, version=2)
+    entry = server.SharedSnapshot(shared.path).read()
+    shared.publish(newer)
+    reader = server.SharedSnapshot(shared.path)
+    assert reader.read().seq > entry.seq
+    assert reader.read().bodies[None] == newer.body
+
+
+def test_publish_recovers_from_dead_publisher(shared):
+    entry = shared.publish(snapshot(800, version=1))
+    # A publisher died between its two sequence writes
+    struct.pack_into('<Q', shared._map, 8, entry.seq + 1)
+    reader = server.SharedSnapshot(shared.path)
+    assert reader.read() is None
+
+    newer = snapshot(900, version=2)
+    recovered = shared.publish(newer)
+    assert recovered is not None and recovered.seq % 2 == 0
+    assert reader.read().bodies[None] == newer.body
+
+
+def test_publish_recovers_even_with_the_same_token(shared):
+    snap = snapshot(800)
+    entry = shared.publish(snap)
+    struct.pack_into('<Q', shared._map, 8, entry.seq + 1)
+    assert shared.publish(snap).bodies[None] == snap.body
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def cache():
+    return server.StaticFileCache(max_bytes=100, max_file_bytes=60)
+
+
+def write(path, content, mtime_ns=None):
+    path.write_bytes(content)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path), os.stat(path)
+
+
+def test_lookup_loads_once(cache, tmp_path):
+    path, st = write(tmp_path / 'a.png', b'x' * 10)
+    entry = cache.lookup(path, st, 'image/png')
+    assert entry.body == b'x' * 10
+    assert entry.etag == server.file_etag(st.st_mtime_ns, st.st_size)
+    assert cache.lookup(path, st, 'image/png') is entry
+    assert (cache.hits, cache.misses, cache.bytes, len(cache)) == (1, 1, 10, 1)
+
+
+def test_prebuilt_headers(cache, tmp_path):
+    path, st = write(tmp_path / 'a.png', b'x' * 10)
+    headers = cache.lookup(path, st, 'image/png').headers.decode('latin-1')
+    assert 'Content-Length: 10\r\n' in headers
+    assert 'Accept-Ranges: bytes\r\n' in headers
+    assert f'ETag: {server.file_etag(st.st_mtime_ns, st.st_size)}\r\n' in headers
+    assert 'Cache-Control' not in headers
+
+
+def test_changed_file_is_reloaded(cache, tmp_path):
+    path, st = write(tmp_path / 'a.png', b'old', mtime_ns=1_000_000_000)
+    old = cache.lookup(path, st, 'image/png')
+    path, st = write(tmp_path / 'a.png', b'new', mtime_ns=2_000_000_000)
+    new = cache.lookup(path, st, 'image/png')
+    assert new.body == b'new' and new.etag != old.etag
+    assert (cache.bytes, len(cache)) == (3, 1)
+
+
+def test_large_files_are_not_cached(cache, tmp_path):
+    path, st = write(tmp_path / 'big.gif', b'x' * 61)
+    assert cache.lookup(path, st, 'image/gif') is None
+    assert (cache.misses, len(cache)) == (0, 0)
+
+
+def test_least_recently_used_is_evicted(cache, tmp_path):
+    a = write(tmp_path / 'a.png', b'a' * 40)
+    b = write(tmp_path / 'b.png', b'b' * 40)
+    c = write(tmp_path / 'c.png', b'c' * 40)
+    cache.lookup(*a, 'image/png')
+    cache.lookup(*b, 'image/png')
+    cache.lookup(*a, 'image/png')
+    cache.lookup(*c, 'image/png')
+    assert cache.bytes == 80
+    hits = cache.hits
+    cache.lookup(*a, 'image/png')
+    cache.lookup(*c, 'image/png')
+    assert cache.hits == hits + 2
+    cache.lookup(*b, 'image/png')
+    assert cache.misses == 4
@@ -0,0 +1,93 @@
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+
+
+@pytest.fixture
+def backend(tmp_path):
+    path = str(tmp_path / 'messi-stats.db')
+    server.migrate_to_sqlite(path, server.STATS_FILE, str(tmp_path / 'no-matches.jsonl'))
+    return server.SQLiteBackend(path)
+
+
+def wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_forked_child_opens_its_own_connection(backend):
+    parent = backend._db()
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            child = backend._db()
+            ok = child is not parent and backend._inherited == [parent] and backend.token() >= 1
+            os.write(write, b'1' if ok else b'0')
+        finally:
+            os._exit(0)
+    os.close(write)
+    assert os.read(read, 1) == b'1'
+    os.close(read)
+    os.waitpid(pid, 0)
+    # The master's connection is untouched by the child
+    assert backend._db() is parent
+    assert backend._inherited == []
+    assert backend.token() >= 1
+
+
+def test_write_in_one_worker_is_seen_by_the_other(backend, tmp_path):
+    store = server.StatsStore(backend, group_window=0)
+    # As run() does before forking: the master already holds a connection
+    goals = store.get().data['teams']['psg']['goals'] + 1
+    results = tmp_path / 'results'
+    results.mkdir()
+
+    def start_worker(slot):
+        if slot == 0:
+            def mutate(data):
+                data['teams']['psg']['goals'] = goals
+            store.update(mutate)
+            seen = goals
+        else:
+            wait_for(lambda: store.get().data['teams']['psg']['goals'] == goals)
+            seen = store.get().data['teams']['psg']['goals']
+        report = {'goals': seen, 'own_connection': backend._local.pid == os.getpid()}
+        (results / f'{slot}.tmp').write_text(json.dumps(report))
+        os.rename(results / f'{slot}.tmp', results / f'{slot}.json')
+        while True:
+            time.sleep(1)
+
+    supervisor = server.Supervisor(2, start_worker)
+
+    def stop_when_done():
+        wait_for(lambda: len(list(results.glob('*.json'))) == 2, timeout=20)
+        supervisor._stop(None, None)
+
+    handlers = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+    watcher = threading.Thread(target=stop_when_done)
+    watcher.start()
+    try:
+        supervisor.serve_forever()
+    finally:
+        watcher.join()
+        signal.signal(signal.SIGTERM, handlers[0])
+        signal.signal(signal.SIGINT, handlers[1])
+
+    reports = [json.loads((results / f'{slot}.json').read_text()) for slot in (0, 1)]
+    assert reports == [{'goals': goals, 'own_connection': True}] * 2
+    assert supervisor.workers == {}
+    # And the master, on its own pre-fork connection, sees it too
+    assert store.get().data['teams']['psg']['goals'] == goals
@@ -0,0 +1,185 @@
+import copy
+import json
+import random
+
+import pytest
+
+import server
+
+TEAMS = {
+    'barcelona': {'matches': 778, 'goals': 672, 'assists': 303, 'titles': 35,
+                  'goals_by_year': {'2011': 59, '2012': 79},
+                  'major_titles': {'la_liga': 10, 'champions_league': 4}},
+    'psg': {'matches': 75, 'goals': 32, 'assists': 34, 'titles': 3,
+            'goals_by_year': {'2022': 17},
+            'major_titles': {'ligue1': 2}},
+    'argentina': {'matches': 191, 'goals': 112, 'assists': 58, 'titles': 6,
+                  'goals_by_year': {'2012': 12, '2022': 18},
+                  'major_titles': {'copa_mundial': 1}},
+}
+
+
+def results(views):
+    return {name: views.result(name) for name in views.views}
+
+
+def test_build_sums_every_team():
+    views = server.ViewSet.build(TEAMS)
+    assert views.result('career_totals') == {'matches': 1044, 'goals': 816, 'assists': 395,
+                                             'titles': 44}
+    assert views.result('goals_by_year') == {'2011': 59, '2012': 91, '2022': 35}
+    assert views.result('titles_by_competition') == {'la_liga': 10, 'champions_league': 4,
+                                                     'ligue1': 2, 'copa_mundial': 1}
+
+
+def test_evolve_matches_a_rebuild():
+    views = server.ViewSet.build(TEAMS)
+    teams = copy.deepcopy(TEAMS)
+    teams['psg']['goals'] = 40
+    teams['psg']['goals_by_year']['2023'] = 9
+    teams['argentina']['major_titles']['copa_america'] = 2
+    evolved = views.evolve(teams, ['psg', 'argentina'])
+    assert results(evolved) == results(server.ViewSet.build(teams))
+
+
+def test_evolve_added_and_removed_teams():
+    views = server.ViewSet.build(TEAMS)
+    teams = copy.deepcopy(TEAMS)
+    del teams['psg']
+    teams['inter_miami'] = {'matches': 80, 'goals': 70, 'assists': 30, 'titles': 3,
+                            'goals_by_year': {'2024': 20}, 'major_titles': {'leagues_cup': 1}}
+    evolved = views.evolve(teams, ['psg', 'inter_miami'])
+    assert results(evolved) == results(server.ViewSet.build(teams))
+
+
+def test_evolve_leaves_the_original_untouched():
+    views = server.ViewSet.build(TEAMS)
+    totals = copy.deepcopy(views._totals)
+    teams = copy.deepcopy(TEAMS)
+    teams['barcelona']['goals'] = 700
+    teams['barcelona']['goals_by_year']['2012'] = 80
+    teams['argentina']['major_titles']['copa_america'] = 2
+    del teams['psg']
+    views.evolve(teams, ['barcelona', 'argentina', 'psg'])
+    assert views._totals == totals
+    # Nothing was read before evolve(), so these come from the totals
+    assert results(views) == results(server.ViewSet.build(TEAMS))
+
+
+def test_zero_counts_are_left_out_both_ways():
+    teams = copy.deepcopy(TEAMS)
+    teams['psg']['major_titles']['supercopa_francia'] = 0
+    views = server.ViewSet.build(teams)
+    assert 'supercopa_francia' not in views.result('titles_by_competition')
+    teams = copy.deepcopy(teams)
+    teams['argentina']['major_titles']['copa_mundial'] = 0
+    evolved = views.evolve(teams, ['argentina'])
+    assert 'copa_mundial' not in evolved.result('titles_by_competition')
+    assert evolved._totals == server.ViewSet.build(teams)._totals
+
+
+def random_team(rng):
+    return {'matches': rng.randint(0, 3), 'goals': rng.randint(0, 3),
+            'assists': rng.randint(0, 3), 'titles': rng.randint(0, 3),
+            'goals_by_year': {year: rng.randint(0, 2)
+                              for year in rng.sample(['2020', '2021', '2022'], rng.randint(0, 3))},
+            'major_titles': {key: rng.randint(0, 2)
+                             for key in rng.sample(['a', 'b', 'c'], rng.randint(0, 3))}}
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_evolve_equals_rebuild_after_random_edits(seed):
+    rng = random.Random(seed)
+    keys = ['t1', 't2', 't3', 't4']
+    teams = {key: random_team(rng) for key in rng.sample(keys, rng.randint(0, 4))}
+    views = server.ViewSet.build(teams)
+    for _ in range(10):
+        changed = rng.sample(keys, rng.randint(1, 4))
+        teams = copy.deepcopy(teams)
+        for key in changed:
+            if key in teams and rng.random() < 0.3:
+                del teams[key]
+            else:
+                teams[key] = random_team(rng)
+        views = views.evolve(teams, changed)
+        rebuilt = server.ViewSet.build(teams)
+        assert views._totals == rebuilt._totals
+        assert results(views) == results(rebuilt)
+
+
+def test_evolve_keeps_cached_results_of_unchanged_views():
+    views = server.ViewSet.build(TEAMS)
+    by_year = views.result('goals_by_year')
+    teams = copy.deepcopy(TEAMS)
+    teams['psg']['assists'] = 40
+    evolved = views.evolve(teams, ['psg'])
+    assert evolved.result('goals_by_year') is by_year
+    assert evolved.result('career_totals')['assists'] == 401
+
+
+def test_carry_views_finds_changed_teams():
+    views = server.ViewSet.build(TEAMS)
+    old = {'teams': TEAMS}
+    assert server.carry_views(views, old, copy.deepcopy(old)) is views
+    new = copy.deepcopy(old)
+    new['teams']['argentina']['goals'] = 115
+    carried = server.carry_views(views, old, new)
+    assert carried.result('career_totals')['goals'] == 819
+
+
+def document():
+    data = {'teams': copy.deepcopy(TEAMS),
+            'career_totals': {'matches': 0, 'goals': 0, 'assists': 0, 'titles': 0},
+            'titles_detail': {'total': 0, 'major_titles_summary': '', 'by_competition': {
+                'champions_league': {'count': 4, 'answer': 'Gané 4 Champions League con el Barcelona'},
+            }}}
+    return data
+
+
+def test_materialize_rewrites_mirrored_fields():
+    base = document()
+    data = copy.deepcopy(base)
+    data['teams']['barcelona']['major_titles']['champions_league'] = 5
+    views = server.ViewSet.build(data['teams'])
+    server.materialize_views(data, base, views)
+    assert data['career_totals']['goals'] == 816
+    champions = data['titles_detail']['by_competition']['champions_league']
+    assert champions == {'count': 5, 'answer': 'Gané 5 Champions League con el Barcelona'}
+    # Only fields the document already has are written
+    assert 'ligue1' not in data['titles_detail']['by_competition']
+
+
+def test_materialize_refuses_a_conflicting_override():
+    base = document()
+    server.materialize_views(base, base, server.ViewSet.build(base['teams']))
+    data = copy.deepcopy(base)
+    data['career_totals']['titles'] = 50
+    with pytest.raises(server.DerivedFieldError):
+        server.materialize_views(data, base, server.ViewSet.build(data['teams']))
+
+
+def test_materialize_accepts_an_override_equal_to_the_derived_value():
+    base = document()
+    data = copy.deepcopy(base)
+    data['career_totals']['titles'] = 44
+    server.materialize_views(data, base, server.ViewSet.build(data['teams']))
+    assert data['career_totals']['titles'] == 44
+
+
+def test_title_answer_lists_years_only_while_they_match_the_count():
+    years = ['2021', '2024']
+    assert server.title_answer('copa_america', 2, years) == \
+        'Gané 2 Copas América con Argentina en 2021 y 2024'
+    assert server.title_answer('copa_america', 3, years) == 'Gané 3 Copas América con Argentina'
+    assert server.title_answer('copa_america', 1, ['2021']) == \
+        'Gané 1 Copa América con Argentina en 2021'
+    assert server.title_answer('copa_america', 0, []) == \
+        'No he ganado ninguna Copa América con Argentina'
+
+
+def test_shipped_title_fields_match_the_teams():
+    with open('js/messi-stats.json', encoding='utf-8') as f:
+        data = json.load(f)
+    base = copy.deepcopy(data)
+    server.materialize_views(data, base, server.ViewSet.build(data['teams']))
+    assert data == base